@@ -8,6 +8,8 @@ import tempfile
 import numpy as np
 import hashlib
 import shutil
+import functools
+from dataclasses import dataclass, field
 from typing import Tuple, List, Dict, Optional, Any
 
 # Import logger
@@ -472,45 +474,14 @@ def process_audio_input(audio_input, temp_dir):
         raise ValueError(f"Unsupported audio input type: {type(audio_input)}. Expected dict, str, or torch.Tensor")
 
 
-def transcribe_audio(audio_path: str, model_size: str = "base", language: str = "en") -> Tuple[Any, Any]:
+@functools.lru_cache(maxsize=1)
+def _select_whisper_device() -> Tuple[str, str]:
     """
-    Transcribe audio using faster-whisper with word-level timestamps.
-    Results are cached based on audio file hash.
-    
-    Args:
-        audio_path: Path to audio file
-        model_size: Whisper model size (tiny, base, small, medium, large)
-        language: Language code (e.g., "en", "es", "fr")
+    Pick the device and compute type for Whisper (detected once per process).
     
     Returns:
-        Tuple of (segments, info) where segments contain word-level timestamps
+        Tuple of (device, compute_type)
     """
-    if not HAS_WHISPER:
-        error_msg = "faster-whisper is not installed. Please run: pip install faster-whisper"
-        logger.error(error_msg)
-        raise ImportError(error_msg)
-    
-    if not os.path.exists(audio_path):
-        error_msg = f"Audio file not found: {audio_path}"
-        logger.error(error_msg)
-        raise FileNotFoundError(error_msg)
-    
-    # Check cache first
-    if HAS_CACHE:
-        cache_manager = get_cache_manager()
-        # Generate cache key from file hash and parameters
-        with open(audio_path, 'rb') as f:
-            file_hash = hashlib.sha256(f.read()).hexdigest()
-        cache_key = f"transcription_{file_hash}_{model_size}_{language}"
-        
-        cached_result = cache_manager.get(cache_key)
-        if cached_result is not None:
-            logger.info(f"Using cached transcription for {os.path.basename(audio_path)}")
-            return cached_result['segments'], cached_result['info']
-    
-    logger.info(f"Transcribing audio: {os.path.basename(audio_path)} (model: {model_size}, language: {language})")
-    
-    # Determine device and compute type
     # Try to use GPU if available, fallback to CPU
     device = "cpu"
     compute_type = "int8"
@@ -519,13 +490,37 @@ def transcribe_audio(audio_path: str, model_size: str = "base", language: str =
         import torch
         if torch.cuda.is_available():
             device = "cuda"
-            compute_type = "float16"  # Better performance on GPU
+            # int8 weights with float16 activations: faster and ~half the VRAM of
+            # float16, same accuracy (CTranslate2 falls back if the GPU lacks int8)
+            compute_type = "int8_float16"
             logger.info("Using GPU for Whisper transcription")
         else:
             logger.info("GPU not available, using CPU for Whisper transcription")
     except ImportError:
         logger.warning("PyTorch not available, cannot detect GPU. Using CPU.")
     
+    return device, compute_type
+
+
+def get_whisper_model(model_size: str = "base") -> Any:
+    """
+    Get a loaded faster-whisper model, loading it on first use.
+    Models stay resident for the life of the process so repeated renders
+    skip the multi-hundred-MB load.
+    
+    Args:
+        model_size: Whisper model size (tiny, base, small, medium, large)
+    
+    Returns:
+        WhisperModel instance
+    """
+    if not HAS_WHISPER:
+        error_msg = "faster-whisper is not installed. Please run: pip install faster-whisper"
+        logger.error(error_msg)
+        raise ImportError(error_msg)
+    
+    device, compute_type = _select_whisper_device()
+    
     # Cache model instances to avoid reloading
     model_key = f"{model_size}_{device}_{compute_type}"
     if model_key not in _whisper_models:
@@ -604,7 +599,51 @@ def transcribe_audio(audio_path: str, model_size: str = "base", language: str =
     else:
         logger.debug(f"Reusing cached Whisper model: {model_key}")
     
-    model = _whisper_models[model_key]
+    return _whisper_models[model_key]
+
+
+def transcribe_audio(audio_path: str, model_size: str = "base", language: str = "en",
+                     model: Optional[Any] = None) -> Tuple[Any, Any]:
+    """
+    Transcribe audio using faster-whisper with word-level timestamps.
+    Results are cached based on audio file hash.
+    
+    Args:
+        audio_path: Path to audio file
+        model_size: Whisper model size (tiny, base, small, medium, large)
+        language: Language code (e.g., "en", "es", "fr")
+        model: Preloaded WhisperModel (defaults to the cached model for model_size)
+    
+    Returns:
+        Tuple of (segments, info) where segments contain word-level timestamps
+    """
+    if not HAS_WHISPER:
+        error_msg = "faster-whisper is not installed. Please run: pip install faster-whisper"
+        logger.error(error_msg)
+        raise ImportError(error_msg)
+    
+    if not os.path.exists(audio_path):
+        error_msg = f"Audio file not found: {audio_path}"
+        logger.error(error_msg)
+        raise FileNotFoundError(error_msg)
+    
+    # Check cache first
+    if HAS_CACHE:
+        cache_manager = get_cache_manager()
+        # Generate cache key from file hash and parameters
+        with open(audio_path, 'rb') as f:
+            file_hash = hashlib.sha256(f.read()).hexdigest()
+        cache_key = f"transcription_{file_hash}_{model_size}_{language}"
+        
+        cached_result = cache_manager.get(cache_key)
+        if cached_result is not None:
+            logger.info(f"Using cached transcription for {os.path.basename(audio_path)}")
+            return cached_result['segments'], cached_result['info']
+    
+    logger.info(f"Transcribing audio: {os.path.basename(audio_path)} (model: {model_size}, language: {language})")
+    
+    if model is None:
+        model = get_whisper_model(model_size)
     
     # Transcribe with word timestamps
     logger.info("Starting transcription...")
@@ -630,6 +669,57 @@ def transcribe_audio(audio_path: str, model_size: str = "base", language: str =
     return segments_list, info
 
 
+# Per-word timing record used to build WordTimeline arrays in a single pass
+WORD_TIMING_DTYPE = np.dtype([("start", np.float64), ("end", np.float64), ("confidence", np.float64)])
+
+@dataclass
+class WordTimeline:
+    """
+    Word-level timing data stored as parallel arrays (one entry per word).
+    
+    Iterating or indexing yields the same dicts format_word_timestamps used to
+    return, so existing caption/code builders keep working unchanged.
+    """
+    starts: np.ndarray
+    ends: np.ndarray
+    words: List[str]
+    confidences: np.ndarray = field(default=None)
+    
+    def __post_init__(self):
+        if self.confidences is None:
+            self.confidences = np.ones(len(self.words), dtype=np.float64)
+    
+    @classmethod
+    def from_dicts(cls, word_dicts):
+        """Build a timeline from a list of {'word', 'start', 'end'} dicts"""
+        word_dicts = list(word_dicts)
+        return cls(
+            starts=np.fromiter((w['start'] for w in word_dicts), dtype=np.float64, count=len(word_dicts)),
+            ends=np.fromiter((w['end'] for w in word_dicts), dtype=np.float64, count=len(word_dicts)),
+            words=[w['word'] for w in word_dicts],
+            confidences=np.fromiter((w.get('confidence', 1.0) for w in word_dicts),
+                                    dtype=np.float64, count=len(word_dicts))
+        )
+    
+    def __len__(self):
+        return len(self.words)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return WordTimeline(self.starts[index], self.ends[index],
+                                self.words[index], self.confidences[index])
+        return {
+            "word": self.words[index],
+            "start": float(self.starts[index]),
+            "end": float(self.ends[index]),
+            "confidence": float(self.confidences[index])
+        }
+    
+    def __iter__(self):
+        for i in range(len(self.words)):
+            yield self[i]
+
+
 def format_word_timestamps(segments):
     """
     Extract word-level timing data from Whisper segments.
@@ -638,20 +728,25 @@ def format_word_timestamps(segments):
         segments: Whisper transcription segments
     
     Returns:
-        List of dicts with word, start, end, and confidence
+        WordTimeline with parallel start/end/confidence arrays and a word list
     """
     words = []
     
-    for segment in segments:
-        for word in segment.words:
-            words.append({
-                "word": word.word.strip(),
-                "start": word.start,
-                "end": word.end,
-                "confidence": getattr(word, 'probability', 1.0)
-            })
+    def timings():
+        for segment in segments:
+            for word in segment.words:
+                words.append(word.word.strip())
+                yield word.start, word.end, getattr(word, 'probability', 1.0)
+    
+    # One pass: timings stream straight into a structured array, no per-word dicts
+    timing = np.fromiter(timings(), dtype=WORD_TIMING_DTYPE)
     
-    return words
+    return WordTimeline(
+        starts=timing["start"],
+        ends=timing["end"],
+        words=words,
+        confidences=timing["confidence"]
+    )
 
 
 def get_audio_duration(audio_path):
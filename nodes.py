@@ -2,19 +2,31 @@ import torch
 import numpy as np
 import cv2
 import os
+import shutil
+import sys
+import hashlib
+import importlib.util
+import json
+import struct
+import string
 import subprocess
 import tempfile
+import textwrap
+import time
+import glob
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Tuple, Optional, Dict, Any, List
 
-from .audio_processor import process_audio_input, transcribe_audio, format_word_timestamps
+from .audio_processor import process_audio_input, transcribe_audio, format_word_timestamps, get_available_disk_space
 from .caption_generator import generate_caption_code
 from .manim_code_builder import build_manim_script
 from .presets import ColorPresets, ShapePresets, FontPresets, EasingPresets
 from .data_processor import normalize_data, detect_data_type
 from .data_visualization import generate_visualization_code
-from .timeline_scene_manager import TimelineSceneManager, SceneLayer
-from .prompt_to_code import PromptToCodeGenerator
-from .code_validator import validate_manim_code
+from .timeline_scene_manager import TimelineSceneManager, SceneLayer, CAPTION_INJECT_MARKER, _HAS_PLAY_TIMELINE
+from .prompt_to_code import PromptToCodeGenerator, get_code_generator
+from .code_validator import validate_manim_code, validate_python_syntax
 
 # Import logger
 try:
@@ -23,12 +35,467 @@ except ImportError:
     import logging
     logger = logging.getLogger(__name__)
 
+# Renders shell out to the manim CLI, so only its presence matters here; importing
+# it in-process would just add seconds of startup to the first render
+HAS_MANIM = importlib.util.find_spec("manim") is not None
+if not HAS_MANIM:
+    logger.warning("Manim is not installed; Lattice Manim nodes will fail to render")
+
 # Maximum safe number of frames to return (prevents memory issues)
 # This is a starting point - actual limits are calculated dynamically
 # based on resolution in extract_frames_from_video()
 # Increased for high-end systems - can handle much more
 MAX_FRAMES_SAFE = 10000  # ~5.5 minutes at 30fps for high-end systems
 
+# Script header for timeline renders; only the config values vary between calls
+TIMELINE_HEADER_TEMPLATE = string.Template(
+    "from manim import *\n"
+    "import numpy as np\n"
+    "\n"
+    "config.pixel_width = $width\n"
+    "config.pixel_height = $height\n"
+    "config.frame_rate = $frame_rate\n"
+    "config.background_color = $background_color\n"
+)
+
+# Code used for a timeline scene whose prompt could not be turned into Manim code
+SCENE_PLACEHOLDER_TEMPLATE = (
+    "# Scene {scene_id}: {prompt}\n"
+    "circle = Circle(radius=1, color=BLUE)\n"
+    "self.add(circle)"
+)
+
+# Environment variable overriding where Manim render directories are created
+RENDER_TMPDIR_ENV = "LATTICE_MANIM_TMPDIR"
+
+# Extra headroom (MB) required on the render device beyond the estimated frame data
+RENDER_TMPDIR_MARGIN_MB = 256.0
+
+
+def _fast_tmp_dir(required_mb: float = 1024.0) -> Optional[str]:
+    """
+    Pick a fast parent directory for Manim render output.
+
+    Manim writes every frame as a PNG plus the compiled MP4 into its media
+    directory, so putting it on RAM-backed tmpfs (/dev/shm on Linux) avoids
+    hundreds of MB of SSD writes per render.
+
+    Args:
+        required_mb: Estimated space needed for the render in MB
+
+    Returns:
+        Directory to pass as ``dir=`` to tempfile, or None for the system default
+    """
+    override = os.environ.get(RENDER_TMPDIR_ENV)
+    if override:
+        if os.path.isdir(override) and os.access(override, os.W_OK):
+            return override
+        logger.warning(f"{RENDER_TMPDIR_ENV}={override} is not a writable directory. Using default temp directory.")
+        return None
+
+    if sys.platform.startswith("linux"):
+        shm_dir = "/dev/shm"
+        if os.path.isdir(shm_dir) and os.access(shm_dir, os.W_OK):
+            available_mb = get_available_disk_space(shm_dir)
+            if available_mb >= required_mb + RENDER_TMPDIR_MARGIN_MB:
+                return shm_dir
+            logger.debug(f"Not enough space in {shm_dir} ({available_mb:.0f} MB free, need {required_mb:.0f} MB). Using default temp directory.")
+
+    return None
+
+
+def _estimate_render_mb(width: int, height: int, frame_count: int) -> float:
+    """Estimate the space (MB) taken by Manim's raw RGB frames for a render"""
+    return frame_count * width * height * 3 / (1024 * 1024)
+
+
+# Render length assumed when the audio node's input duration can't be determined
+AUDIO_RENDER_FALLBACK_SECONDS = 60.0
+
+
+def _input_audio_seconds(audio: Optional[Any], audio_file_path: str) -> float:
+    """
+    Best-effort duration (seconds) of the audio node's input, read before it is processed.
+    
+    The captioned scene runs as long as the audio, so this sizes the render directory.
+    
+    Args:
+        audio: ComfyUI AUDIO dict, audio tensor, file path, or None
+        audio_file_path: Fallback audio file path
+    
+    Returns:
+        Duration in seconds, or AUDIO_RENDER_FALLBACK_SECONDS if unknown
+    """
+    try:
+        if isinstance(audio, dict):
+            waveform = audio.get("waveform", audio.get("audio"))
+            if waveform is not None:
+                return waveform.shape[-1] / float(audio.get("sample_rate", 44100))
+            audio = audio.get("file_path")
+        elif isinstance(audio, torch.Tensor):
+            return audio.shape[-1] / 44100.0  # process_audio_input's default sample rate
+        
+        path = audio if isinstance(audio, str) else audio_file_path
+        if path and os.path.exists(path):
+            from .audio_processor import get_audio_duration
+            return get_audio_duration(path)
+    except Exception as e:
+        logger.debug(f"Could not determine audio duration up front: {e}")
+    return AUDIO_RENDER_FALLBACK_SECONDS
+
+
+def _write_script(script_path: str, code: str) -> None:
+    """Write a generated Manim script through os.write, skipping the buffered file layer"""
+    data = code.encode("utf-8")
+    fd = os.open(script_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+    finally:
+        os.close(fd)
+
+
+def _require_manim() -> None:
+    """Raise ImportError if Manim is not installed"""
+    if not HAS_MANIM:
+        raise ImportError("Manim is not installed. Please run pip install manim")
+
+
+def _upsample_preview(preview: torch.Tensor, width: int, height: int) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Bicubically resize a [B, H, W, C] preview to the requested size (on GPU when available).
+    
+    Returns:
+        Tuple of (resized preview clamped to [0, 1], matching all-ones mask)
+    """
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    resized = torch.nn.functional.interpolate(
+        preview.to(device).permute(0, 3, 1, 2),
+        size=(height, width),
+        mode="bicubic",
+        align_corners=False
+    )
+    # Bicubic overshoots at hard edges; keep values in the IMAGE range
+    resized = resized.clamp_(0.0, 1.0).permute(0, 2, 3, 1).contiguous().cpu()
+    mask = torch.ones((resized.shape[0], height, width), dtype=torch.float32)
+    return resized, mask
+
+
+# Process-local LRU cache of (preview, mask) results keyed by render inputs
+PREVIEW_CACHE_SIZE = 32
+_preview_cache: "OrderedDict[bytes, Tuple[torch.Tensor, torch.Tensor]]" = OrderedDict()
+
+
+def _preview_cache_key(full_code: str, frame_count: int, width: int, height: int) -> bytes:
+    """Fingerprint a render from its complete script and output settings"""
+    return hashlib.blake2b(
+        full_code.encode("utf-8") + struct.pack("iii", frame_count, width, height),
+        digest_size=16
+    ).digest()
+
+
+def _preview_cache_get(key: bytes) -> Optional[Tuple[torch.Tensor, torch.Tensor]]:
+    """Return a cached (preview, mask) pair and mark it most recently used"""
+    result = _preview_cache.get(key)
+    if result is not None:
+        _preview_cache.move_to_end(key)
+    return result
+
+
+def _preview_cache_put(key: bytes, result: Tuple[torch.Tensor, torch.Tensor]) -> None:
+    """Store a (preview, mask) pair, evicting the least recently used entry"""
+    _preview_cache[key] = result
+    _preview_cache.move_to_end(key)
+    if len(_preview_cache) > PREVIEW_CACHE_SIZE:
+        _preview_cache.popitem(last=False)
+
+
+# On-disk cache of rendered previews, one directory per render key
+RENDER_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "lattice-manim")
+
+# Size budget (MB) for render cache entries; least recently used entries are pruned past it
+RENDER_CACHE_BUDGET_MB = 512.0
+
+
+def _render_cache_key(full_code: str, width: int, height: int, frame_rate: int) -> str:
+    """Fingerprint a render from its complete script and output settings"""
+    return hashlib.blake2b(
+        full_code.encode("utf-8") + struct.pack("III", width, height, frame_rate),
+        digest_size=16
+    ).hexdigest()
+
+
+def _render_cache_load(key: str) -> Optional[Tuple[torch.Tensor, torch.Tensor]]:
+    """Load a cached (preview, mask) pair, or None on a miss or unreadable entry"""
+    cache_dir = os.path.join(RENDER_CACHE_DIR, key)
+    cache_path = os.path.join(cache_dir, "frames.npz")
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with np.load(cache_path) as data:
+            preview_u8 = data["preview"]
+        if preview_u8.dtype != np.uint8:
+            return None  # Entry from an older cache format; re-render and overwrite it
+        preview = np.empty(preview_u8.shape, dtype=np.float32)
+        np.multiply(preview_u8, np.float32(1.0 / 255.0), out=preview)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable render cache entry {key}: {e}")
+        return None
+    
+    # Mark as recently used for LRU pruning
+    os.utime(cache_dir)
+    # The preview mask is always all ones, so it is rebuilt rather than stored
+    mask = torch.ones(preview.shape[:3], dtype=torch.float32)
+    return torch.from_numpy(preview), mask
+
+
+def _render_cache_store(key: str, preview: torch.Tensor) -> None:
+    """Persist a preview as compressed uint8; failures are logged and otherwise ignored"""
+    cache_dir = os.path.join(RENDER_CACHE_DIR, key)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = os.path.join(cache_dir, f"frames.{os.getpid()}.tmp")
+        # Previews are decoded 8-bit frames scaled to 0-1, so uint8 round-trips exactly
+        preview_u8 = np.rint(preview.numpy() * 255.0).astype(np.uint8)
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, preview=preview_u8)
+        os.replace(tmp_path, os.path.join(cache_dir, "frames.npz"))
+    except OSError as e:
+        logger.warning(f"Failed to write render cache entry {key}: {e}")
+        return
+    _prune_cache_dirs(RENDER_CACHE_DIR, RENDER_CACHE_BUDGET_MB, keep=key,
+                      exclude=os.path.basename(MANIM_MEDIA_CACHE_DIR))
+
+
+# Persistent Manim media dirs (with Manim's own caching enabled), one per scene graph
+MANIM_MEDIA_CACHE_DIR = os.path.join(RENDER_CACHE_DIR, "manim-media")
+
+# Size budget (MB) for MANIM_MEDIA_CACHE_DIR; least recently used dirs are pruned past it
+MANIM_MEDIA_CACHE_BUDGET_MB = 2048.0
+
+
+def _scene_graph_key(header: str, layers: List[SceneLayer]) -> str:
+    """
+    Fingerprint a timeline's scene graph: render settings plus each scene's code and timing.
+    
+    Captions are deliberately excluded so caption-only edits reuse the same media dir.
+    """
+    digest = hashlib.blake2b(header.encode("utf-8"), digest_size=16)
+    for layer in layers:
+        digest.update(struct.pack("dd", layer.start_time, layer.end_time))
+        digest.update(layer.manim_code.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _manim_media_dir(graph_key: str) -> str:
+    """Return (creating it if needed) the persistent media dir for a scene graph"""
+    media_dir = os.path.join(MANIM_MEDIA_CACHE_DIR, graph_key)
+    os.makedirs(media_dir, exist_ok=True)
+    # Frames extracted by a previous save_manim_frames call would be picked up as output
+    shutil.rmtree(os.path.join(media_dir, "extracted_frames"), ignore_errors=True)
+    # Mark as recently used for LRU pruning (atime is unreliable on noatime mounts)
+    os.utime(media_dir)
+    return media_dir
+
+
+def _dir_size_mb(path: str) -> float:
+    """Total size of the files under path in MB"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total / (1024 * 1024)
+
+
+def _prune_cache_dirs(cache_dir: str, budget_mb: float, keep: str, exclude: Optional[str] = None) -> None:
+    """
+    Delete least recently used entry dirs under cache_dir until they fit budget_mb.
+    
+    Args:
+        cache_dir: Directory holding one subdirectory per cache entry
+        budget_mb: Size budget for all entries in MB
+        keep: Entry name never pruned (the one just used)
+        exclude: Subdirectory name that is not a cache entry and is left alone
+    """
+    try:
+        entries = [entry for entry in os.scandir(cache_dir) if entry.is_dir() and entry.name != exclude]
+    except OSError:
+        return
+    
+    sizes = {entry.path: _dir_size_mb(entry.path) for entry in entries}
+    total_mb = sum(sizes.values())
+    for entry in sorted(entries, key=lambda e: e.stat().st_mtime):
+        if total_mb <= budget_mb:
+            break
+        if entry.name == keep:
+            continue
+        shutil.rmtree(entry.path, ignore_errors=True)
+        total_mb -= sizes[entry.path]
+        logger.debug(f"Pruned cache entry {entry.path}")
+
+
+def _prune_media_cache(keep: str) -> None:
+    """Delete least recently used media dirs until the cache fits MANIM_MEDIA_CACHE_BUDGET_MB"""
+    _prune_cache_dirs(MANIM_MEDIA_CACHE_DIR, MANIM_MEDIA_CACHE_BUDGET_MB, keep)
+
+
+# Lines of Manim output kept for error reports (Manim is verbose; the rest is dropped)
+MANIM_LOG_TAIL_LINES = 200
+
+
+def _run_manim(cmd: List[str], cwd: str, label: str = "Manim rendering") -> str:
+    """
+    Run a Manim command, streaming its output instead of buffering all of it.
+    
+    Combined stdout/stderr is read line by line into a bounded ring buffer;
+    lines mentioning errors are kept separately so they survive truncation.
+    
+    Args:
+        cmd: Command line to execute
+        cwd: Working directory for the process
+        label: Description used in log and error messages
+    
+    Returns:
+        The retained tail of Manim's output
+    
+    Raises:
+        RuntimeError: If Manim exits with a non-zero status
+    """
+    tail = deque(maxlen=MANIM_LOG_TAIL_LINES)
+    error_lines = deque(maxlen=MANIM_LOG_TAIL_LINES)
+    
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                          text=True, bufsize=1, cwd=cwd) as process:
+        for line in process.stdout:
+            tail.append(line)
+            if "error" in line.lower() or "traceback" in line.lower():
+                error_lines.append(line)
+        returncode = process.wait()
+    
+    output = "".join(tail)
+    if returncode != 0:
+        # Error lines that already scrolled out of the tail are prepended
+        earlier_errors = [line for line in error_lines if line not in tail]
+        error_msg = "".join(earlier_errors) + output
+        logger.error(f"{label} failed.")
+        logger.debug(f"Manim output (last {MANIM_LOG_TAIL_LINES} lines):\n{output}")
+        raise RuntimeError(f"{label} failed.\nLogs:\n{error_msg}")
+    
+    logger.debug(f"Manim output (last 500 chars): {output[-500:]}")
+    return output
+
+
+# Upper bound on concurrent Manim processes for a sharded timeline render
+MAX_RENDER_WORKERS = os.cpu_count() or 1
+
+
+def _split_timeline(layers: List[SceneLayer], shard_count: int) -> List[List[SceneLayer]]:
+    """
+    Split time-ordered layers into contiguous shards of roughly equal size.
+    
+    Shards are only cut where every earlier scene has ended before the next one
+    starts, so scenes overlapping in time always stay in the same shard (a
+    timeline with no such gap yields a single shard).
+    """
+    shard_count = max(1, min(shard_count, len(layers)))
+    
+    # Layer indexes a shard may start at: no earlier scene is still running there
+    cut_points = []
+    max_end = float("-inf")
+    for index, layer in enumerate(layers):
+        if index and layer.start_time >= max_end:
+            cut_points.append(index)
+        max_end = max(max_end, layer.end_time)
+    
+    # Allowed cut nearest to each even split point
+    targets = np.linspace(0, len(layers), shard_count + 1)[1:-1]
+    cuts = sorted({min(cut_points, key=lambda c: abs(c - t)) for t in targets}) if cut_points else []
+    bounds = [0] + cuts + [len(layers)]
+    return [layers[a:b] for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def _render_timeline_shards(header: str, shards: List[List[SceneLayer]],
+                            frame_rate: int, temp_dir: str) -> None:
+    """
+    Render timeline shards as parallel Manim processes and merge their frames.
+    
+    Each shard becomes its own TimelineScene with times shifted by the end of the
+    previous shards, so the gap before its first scene is kept, and is rendered to
+    a PNG sequence in its own media dir. Frames are then moved, in time order, into
+    {temp_dir}/images/script/TimelineScene for save_manim_frames. With
+    manim-play-timeline, a shard ending early is padded (last frame held) up to
+    the next shard's start, matching a single-process render's timing.
+    
+    Args:
+        header: Script header (imports and config) shared by every shard
+        shards: Contiguous, time-ordered groups of scene layers from _split_timeline
+        frame_rate: Frames per second
+        temp_dir: Render directory
+    """
+    # Shard k starts where every scene of shards 0..k-1 has ended
+    offsets = [0.0]
+    for shard in shards[:-1]:
+        offsets.append(max([offsets[-1]] + [layer.end_time for layer in shard]))
+    
+    def render_shard(index: int) -> None:
+        offset = offsets[index]
+        shard_manager = TimelineSceneManager()
+        for layer in shards[index]:
+            shifted = SceneLayer.from_dict(layer.to_dict())
+            shifted.start_time -= offset
+            shifted.end_time -= offset
+            # add_scene assigns next_scene_id; keep the original id for the generated names
+            shard_manager.next_scene_id = layer.scene_id
+            shard_manager.add_scene(shifted)
+        
+        shard_dir = os.path.join(temp_dir, f"shard_{index:03d}")
+        os.makedirs(shard_dir, exist_ok=True)
+        script_path = os.path.join(shard_dir, "script.py")
+        _write_script(script_path, header + "\n" + shard_manager.generate_manim_timeline_code(frame_rate))
+        
+        cmd = [
+            "manim",
+            "-ql",
+            "--disable_caching",
+            "--format", "png",
+            "--media_dir", shard_dir,
+            "-o", "output",
+            script_path
+        ]
+        _run_manim(cmd, shard_dir, label=f"Manim rendering (shard {index})")
+    
+    workers = min(len(shards), MAX_RENDER_WORKERS)
+    logger.info(f"Rendering timeline as {len(shards)} shards on {workers} workers")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Consuming the results re-raises the first shard failure
+        list(executor.map(render_shard, range(len(shards))))
+    
+    merged_dir = os.path.join(temp_dir, "images", "script", "TimelineScene")
+    os.makedirs(merged_dir, exist_ok=True)
+    frame_index = 0
+    for index in range(len(shards)):
+        shard_frames = glob.glob(os.path.join(temp_dir, f"shard_{index:03d}", "**", "*.png"), recursive=True)
+        # Frame numbers are not zero-padded past 9999, so order by length first
+        shard_frames.sort(key=lambda path: (len(path), path))
+        for frame_path in shard_frames:
+            os.replace(frame_path, os.path.join(merged_dir, f"frame_{frame_index:06d}.png"))
+            frame_index += 1
+        
+        # Sequential playback ignores scene times, as it does in a single-process render
+        if _HAS_PLAY_TIMELINE and shard_frames and index + 1 < len(shards):
+            next_start = round(offsets[index + 1] * frame_rate)
+            last_frame = os.path.join(merged_dir, f"frame_{frame_index - 1:06d}.png")
+            while frame_index < next_start:
+                shutil.copyfile(last_frame, os.path.join(merged_dir, f"frame_{frame_index:06d}.png"))
+                frame_index += 1
+    
+    logger.info(f"Merged {frame_index} frames from {len(shards)} shards")
+
 
 def save_manim_frames(temp_dir: str) -> Tuple[torch.Tensor, torch.Tensor]:
     """
@@ -41,10 +508,6 @@ def save_manim_frames(temp_dir: str) -> Tuple[torch.Tensor, torch.Tensor]:
     Returns:
         Tuple of (first_frame_tensor, mask_tensor) for preview
     """
-    import shutil
-    import time
-    import glob
-    
     # Find ComfyUI output directory
     try:
         current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -132,21 +595,31 @@ def save_manim_frames(temp_dir: str) -> Tuple[torch.Tensor, torch.Tensor]:
                     frame_count = 0
                     non_black_frames = 0
                     
-                    while True:
-                        ret, frame = cap.read()
-                        if not ret:
-                            break
+                    # PNG encoding (zlib) dominates this loop; OpenCV releases the GIL
+                    # while encoding, so writes fan out to a thread pool. At most two
+                    # frames per worker are kept in flight to bound memory.
+                    with ThreadPoolExecutor(max_workers=MAX_RENDER_WORKERS) as encoder:
+                        pending_writes = deque()
+                        while True:
+                            ret, frame = cap.read()
+                            if not ret:
+                                break
+                            
+                            # Check if frame is not completely black (simple check)
+                            frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                            if cv2.countNonZero(frame_gray) > 0:
+                                non_black_frames += 1
+                            
+                            # Save frame as PNG
+                            frame_filename = os.path.join(extracted_frames_dir, f"frame_{frame_count:06d}.png")
+                            pending_writes.append(encoder.submit(cv2.imwrite, frame_filename, frame))
+                            if len(pending_writes) >= 2 * MAX_RENDER_WORKERS:
+                                pending_writes.popleft().result()
+                            frame_files.append(frame_filename)
+                            frame_count += 1
                         
-                        # Check if frame is not completely black (simple check)
-                        frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                        if cv2.countNonZero(frame_gray) > 0:
-                            non_black_frames += 1
-                        
-                        # Save frame as PNG
-                        frame_filename = os.path.join(extracted_frames_dir, f"frame_{frame_count:06d}.png")
-                        cv2.imwrite(frame_filename, frame)
-                        frame_files.append(frame_filename)
-                        frame_count += 1
+                        for write in pending_writes:
+                            write.result()
                     
                     cap.release()
                     logger.info(f"Extracted {len(frame_files)} frames from {os.path.basename(video_to_extract)}")
@@ -184,35 +657,38 @@ def save_manim_frames(temp_dir: str) -> Tuple[torch.Tensor, torch.Tensor]:
     
     # Copy frames to output directory with sequential naming
     timestamp = int(time.time() * 1000)
-    saved_frames = []
-    for i, frame_path in enumerate(frame_files):
-        output_filename = f"manim_frame_{timestamp}_{i:06d}.png"
-        saved_frame_path = os.path.join(output_dir, output_filename)
-        shutil.copy2(frame_path, saved_frame_path)
-        saved_frames.append(saved_frame_path)
+    saved_frames = [
+        os.path.join(output_dir, f"manim_frame_{timestamp}_{i:06d}.png")
+        for i in range(len(frame_files))
+    ]
+    with ThreadPoolExecutor(max_workers=MAX_RENDER_WORKERS) as executor:
+        list(executor.map(shutil.copy2, frame_files, saved_frames))
     
     logger.info(f"Saved {len(saved_frames)} frames to: {output_dir}")
     
-    # Load first frame for preview - try to find a non-black frame if possible
-    first_frame_path = saved_frames[0]
-    preview_frame_path = first_frame_path
+    # Load first frame for preview - try to find a non-black frame if possible.
+    # Each candidate is decoded once and the hit is kept, rather than re-reading it.
+    preview_frame_path = saved_frames[0]
+    first_frame = None
+    frame_gray = None
     
     # Try to find a non-black frame for preview (skip initial black frames)
     for frame_path in saved_frames[:min(30, len(saved_frames))]:  # Check first 30 frames
         test_frame = cv2.imread(frame_path)
         if test_frame is not None:
             test_gray = cv2.cvtColor(test_frame, cv2.COLOR_BGR2GRAY)
+            if frame_path == saved_frames[0]:
+                first_frame, frame_gray = test_frame, test_gray
             if cv2.countNonZero(test_gray) > 0:  # Has non-black pixels
                 preview_frame_path = frame_path
+                first_frame, frame_gray = test_frame, test_gray
                 logger.debug(f"Using non-black frame for preview: {os.path.basename(preview_frame_path)}")
                 break
     
-    first_frame = cv2.imread(preview_frame_path)
     if first_frame is None:
         raise RuntimeError(f"Failed to read preview frame: {preview_frame_path}")
     
     # Check if frame is completely black
-    frame_gray = cv2.cvtColor(first_frame, cv2.COLOR_BGR2GRAY)
     non_black_pixels = cv2.countNonZero(frame_gray)
     total_pixels = frame_gray.shape[0] * frame_gray.shape[1]
     black_ratio = 1.0 - (non_black_pixels / total_pixels) if total_pixels > 0 else 1.0
@@ -222,14 +698,15 @@ def save_manim_frames(temp_dir: str) -> Tuple[torch.Tensor, torch.Tensor]:
         logger.warning("This may indicate the Manim scene did not render visible content")
         logger.warning("Check the generated Manim code to ensure it creates visible objects")
     
-    # Convert BGR to RGB and normalize
-    frame_rgb = cv2.cvtColor(first_frame, cv2.COLOR_BGR2RGB)
-    frame_normalized = torch.from_numpy(frame_rgb.astype(np.float32) / 255.0)
-    # Add batch dimension: [1, H, W, C]
-    preview_tensor = frame_normalized.unsqueeze(0)
+    # Convert BGR to RGB and normalize straight into a preallocated [1, H, W, C] buffer
+    h, w = first_frame.shape[:2]
+    frame_rgb = np.empty((h, w, 3), dtype=np.uint8)
+    cv2.cvtColor(first_frame, cv2.COLOR_BGR2RGB, dst=frame_rgb)
+    preview = np.empty((1, h, w, 3), dtype=np.float32)
+    np.multiply(frame_rgb, np.float32(1.0 / 255.0), out=preview[0])
+    preview_tensor = torch.from_numpy(preview)
     
     # Create mask for single frame
-    h, w, _ = preview_tensor.shape[1:]
     mask_tensor = torch.ones((1, h, w), dtype=torch.float32)
     
     logger.info(f"Preview frame: {os.path.basename(preview_frame_path)}, size: {w}x{h}, black ratio: {black_ratio*100:.1f}%")
@@ -305,20 +782,21 @@ def extract_frames_from_video(video_path: str, max_frames: Optional[int] = None)
     if total_frames > max_frames:
         logger.warning(f"Video has {total_frames} frames, which would require {estimated_memory_gb:.2f} GB. Limiting to {max_frames} frames to prevent memory issues.")
         logger.warning(f"Consider using frame sampling or splitting long videos into segments.")
-        # Sample frames evenly
-        frame_skip = total_frames / max_frames
         target_frames = max_frames
     else:
-        frame_skip = 1.0
         target_frames = total_frames
     
+    # Sample frames evenly: precompute the (strictly increasing) source indices to keep
+    keep_indices = np.linspace(0, total_frames - 1, target_frames).round().astype(np.int64)
+    
     # Final memory check before allocation
     final_memory_gb = target_frames * height * width * 3 * 4 / (1024**3)
     logger.info(f"Allocating {target_frames} frames at {width}x{height} - {final_memory_gb:.2f} GB")
     
-    # Pre-allocate tensor to avoid memory spikes from list + stack
+    # Pre-allocate a uint8 buffer to avoid memory spikes from list + stack;
+    # normalization to float32 happens once for the whole batch after decoding
     try:
-        image_tensor = torch.zeros((target_frames, height, width, 3), dtype=torch.float32)
+        image_u8 = torch.empty((target_frames, height, width, 3), dtype=torch.uint8)
     except RuntimeError as e:
         cap.release()  # Make sure to release before raising
         error_msg = f"Failed to allocate memory for {target_frames} frames at {width}x{height} ({final_memory_gb:.2f} GB). System may be out of memory."
@@ -327,15 +805,19 @@ def extract_frames_from_video(video_path: str, max_frames: Optional[int] = None)
     
     frame_idx = 0
     output_idx = 0
-    next_frame_to_keep = 0.0
+    keep_iter = iter(keep_indices.tolist())
+    next_keep = next(keep_iter, None)
     
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        
-        # Sample frames if needed
-        if frame_idx >= next_frame_to_keep:
+    while next_keep is not None:
+        # Skipped frames are only grabbed, not decoded into a BGR image
+        if frame_idx != next_keep:
+            if not cap.grab():
+                break
+        else:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            
             # Convert BGR to RGB
             frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
             
@@ -343,17 +825,10 @@ def extract_frames_from_video(video_path: str, max_frames: Optional[int] = None)
             if frame_rgb.shape[1] != width or frame_rgb.shape[0] != height:
                 frame_rgb = cv2.resize(frame_rgb, (width, height), interpolation=cv2.INTER_AREA)
             
-            # Normalize in one step
-            frame_normalized = torch.from_numpy(frame_rgb.astype(np.float32) / 255.0)
-            
-            # Write directly to pre-allocated tensor
-            image_tensor[output_idx] = frame_normalized
+            # Write raw pixels directly to pre-allocated buffer
+            image_u8[output_idx] = torch.from_numpy(frame_rgb)
             output_idx += 1
-            next_frame_to_keep += frame_skip
-            
-            # Stop if we've reached our limit
-            if output_idx >= target_frames:
-                break
+            next_keep = next(keep_iter, None)
         
         frame_idx += 1
         
@@ -367,9 +842,18 @@ def extract_frames_from_video(video_path: str, max_frames: Optional[int] = None)
     
     # Trim to actual extracted frame count
     if output_idx < target_frames:
-        image_tensor = image_tensor[:output_idx]
+        image_u8 = image_u8[:output_idx]
         logger.info(f"Adjusted frame count from {target_frames} to {output_idx}")
     
+    # Normalize the whole batch in one vectorized cast + multiply
+    try:
+        image_tensor = image_u8.to(torch.float32).mul_(1.0 / 255.0)
+    except RuntimeError as e:
+        error_msg = f"Failed to allocate memory for {output_idx} frames at {width}x{height} ({final_memory_gb:.2f} GB). System may be out of memory."
+        logger.error(error_msg)
+        raise RuntimeError(error_msg) from e
+    del image_u8
+    
     logger.info(f"Successfully extracted {output_idx} frames (from {frame_idx} total frames in video)")
     
     return image_tensor, width, height
@@ -388,6 +872,10 @@ class ManimScriptNode:
                 "width": ("INT", {"default": 512, "min": 64, "max": 4096}),
                 "height": ("INT", {"default": 512, "min": 64, "max": 4096}),
             },
+            "optional": {
+                # Render at half resolution and upsample the preview (4x fewer pixels to rasterize)
+                "fast_preview": ("BOOLEAN", {"default": False}),
+            },
         }
 
     RETURN_TYPES = ("IMAGE", "MASK")
@@ -395,33 +883,41 @@ class ManimScriptNode:
     FUNCTION = "render_manim"
     CATEGORY = "Lattice/Experimental"
 
-    def render_manim(self, code: str, frame_count: int, width: int, height: int) -> Tuple[torch.Tensor, torch.Tensor]:
-        try:
-            import manim
-        except ImportError:
-            raise ImportError("Manim is not installed. Please run pip install manim")
+    def render_manim(self, code: str, frame_count: int, width: int, height: int,
+                     fast_preview: bool = False) -> Tuple[torch.Tensor, torch.Tensor]:
+        _require_manim()
         
-        # Create temporary directory for Manim output
-        with tempfile.TemporaryDirectory() as temp_dir:
-            script_path = os.path.join(temp_dir, "script.py")
-            
-            # Prepend Manim config header to set pixel dimensions programmatically
-            config_header = f"""from manim import *
-config.pixel_width = {width}
-config.pixel_height = {height}
+        # Cairo rasterization dominates -ql renders; fast previews render a quarter of the pixels
+        render_width, render_height = (max(width // 2, 32), max(height // 2, 32)) if fast_preview else (width, height)
+        
+        # Prepend Manim config header to set pixel dimensions programmatically
+        config_header = f"""from manim import *
+config.pixel_width = {render_width}
+config.pixel_height = {render_height}
 config.frame_rate = 30
 
 """
-            full_code = config_header + code
-            
-            # Validate code before rendering
-            is_valid, validation_error = validate_manim_code(full_code)
-            if not is_valid:
-                raise ValueError(f"Manim code has syntax errors:\n{validation_error}")
+        full_code = config_header + code
+        
+        # Reuse the preview from an identical earlier render in this session
+        cache_key = _preview_cache_key(full_code, frame_count, width, height)
+        cached = _preview_cache_get(cache_key)
+        if cached is not None:
+            logger.debug("Using cached Manim preview for unchanged inputs")
+            return cached
+        
+        # Validate code before rendering
+        is_valid, validation_error = validate_manim_code(full_code)
+        if not is_valid:
+            raise ValueError(f"Manim code has syntax errors:\n{validation_error}")
+        
+        # Create temporary directory for Manim output (tmpfs when available)
+        render_tmp = _fast_tmp_dir(_estimate_render_mb(width, height, frame_count))
+        with tempfile.TemporaryDirectory(dir=render_tmp) as temp_dir:
+            script_path = os.path.join(temp_dir, "script.py")
             
             # Write the script to file
-            with open(script_path, "w", encoding="utf-8") as f:
-                f.write(full_code)
+            _write_script(script_path, full_code)
             
             # Build subprocess command
             # Note: Manim always renders frames to partial_movie_files, then compiles to video
@@ -437,30 +933,14 @@ config.frame_rate = 30
             ]
             
             # Execute Manim command
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                cwd=temp_dir
-            )
-            
-            # Check for errors
-            if result.returncode != 0:
-                error_msg = result.stderr if result.stderr else result.stdout
-                logger.error("Manim rendering failed.")
-                logger.debug(f"Manim stderr: {result.stderr}")
-                logger.debug(f"Manim stdout: {result.stdout}")
-                raise RuntimeError(f"Manim rendering failed.\nLogs:\n{error_msg}")
-            
-            # Log Manim output for debugging
-            if result.stdout:
-                logger.debug(f"Manim stdout: {result.stdout[:500]}")
-            if result.stderr:
-                logger.debug(f"Manim stderr: {result.stderr[:500]}")
+            _run_manim(cmd, temp_dir)
             
             # Save PNG frames and get preview
             preview_tensor, mask_tensor = save_manim_frames(temp_dir)
+            if fast_preview:
+                preview_tensor, mask_tensor = _upsample_preview(preview_tensor, width, height)
             
+            _preview_cache_put(cache_key, (preview_tensor, mask_tensor))
             return (preview_tensor, mask_tensor)
 
 
@@ -497,7 +977,7 @@ class ManimAudioCaptionNode:
                 "caption_font": (fonts if fonts else ["Arial"], {"default": fonts[0] if fonts else "Arial"}),
                 "caption_font_size": ("INT", {"default": 48, "min": 12, "max": 200}),
                 "caption_color": (colors, {"default": "WHITE"}),
-                "caption_bg_color": (colors + ["TRANSPARENT"], {"default": "TRANSPARENT"}),
+                "caption_bg_color": (ColorPresets.get_manim_colors_with_transparent(), {"default": "TRANSPARENT"}),
                 
                 # Shape Animations
                 "enable_shape_animations": ("BOOLEAN", {"default": True}),
@@ -514,7 +994,7 @@ class ManimAudioCaptionNode:
                 "easing_function": (easing, {"default": "smooth"}),
                 
                 # Background
-                "background_color": (colors + ["CUSTOM"], {"default": "BLACK"}),
+                "background_color": (ColorPresets.get_manim_colors_with_custom(), {"default": "BLACK"}),
                 "background_color_hex": ("STRING", {"default": "#000000"}),
                 
                 # Rendering
@@ -557,15 +1037,14 @@ class ManimAudioCaptionNode:
         height: int = 1080, 
         frame_rate: int = 30
     ) -> Tuple[torch.Tensor, torch.Tensor]:
-        try:
-            import manim
-        except ImportError:
-            raise ImportError("Manim is not installed. Please run pip install manim")
+        _require_manim()
         
         # Process audio if provided
         # Use a single temp directory for both audio processing and rendering
         # so the audio file persists throughout the entire process
-        with tempfile.TemporaryDirectory() as temp_dir:
+        render_seconds = _input_audio_seconds(audio, audio_file_path)
+        render_tmp = _fast_tmp_dir(_estimate_render_mb(width, height, int(render_seconds * frame_rate)))
+        with tempfile.TemporaryDirectory(dir=render_tmp) as temp_dir:
             captions = None
             audio_path = None
             
@@ -625,8 +1104,7 @@ class ManimAudioCaptionNode:
             if "self.add(" not in full_code and "self.play(" not in full_code:
                 logger.warning("Generated Manim code may not have visible content - no self.add() or self.play() calls found")
             
-            with open(script_path, "w", encoding="utf-8") as f:
-                f.write(full_code)
+            _write_script(script_path, full_code)
             logger.info(f"Script written to: {script_path}")
             
             output_name = "output"
@@ -641,29 +1119,10 @@ class ManimAudioCaptionNode:
             
             logger.info("Starting Manim rendering...")
             logger.debug(f"Manim command: {' '.join(cmd)}")
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                cwd=temp_dir
-            )
+            _run_manim(cmd, temp_dir)
             
             logger.info("Manim rendering completed")
             
-            # Check for errors
-            if result.returncode != 0:
-                error_msg = result.stderr if result.stderr else result.stdout
-                logger.error("Manim rendering failed.")
-                logger.error(f"Manim stderr: {result.stderr}")
-                logger.error(f"Manim stdout: {result.stdout}")
-                raise RuntimeError(f"Manim rendering failed.\nLogs:\n{error_msg}")
-            
-            # Log Manim output for debugging
-            if result.stdout:
-                logger.info(f"Manim stdout (first 500 chars): {result.stdout[:500]}")
-            if result.stderr:
-                logger.debug(f"Manim stderr (first 500 chars): {result.stderr[:500]}")
-            
             # Save PNG frames and get preview
             logger.info("Extracting PNG frames from Manim output...")
             
@@ -800,10 +1259,7 @@ class ManimDataVisualizationNode:
         height: int = 1080, 
         frame_rate: int = 30
     ) -> Tuple[torch.Tensor, torch.Tensor]:
-        try:
-            import manim
-        except ImportError:
-            raise ImportError("Manim is not installed. Please run pip install manim")
+        _require_manim()
         
         # Process data
         data_info = normalize_data(data, data_format)
@@ -867,11 +1323,11 @@ class DataVisualization(Scene):
             raise ValueError(f"Generated Manim code has errors:\n{validation_error}")
         
         # Render
-        with tempfile.TemporaryDirectory() as temp_dir:
+        render_tmp = _fast_tmp_dir(_estimate_render_mb(width, height, int(animation_duration * frame_rate)))
+        with tempfile.TemporaryDirectory(dir=render_tmp) as temp_dir:
             script_path = os.path.join(temp_dir, "script.py")
             
-            with open(script_path, "w", encoding="utf-8") as f:
-                f.write(full_code)
+            _write_script(script_path, full_code)
             
             output_name = "output"
             cmd = [
@@ -883,26 +1339,7 @@ class DataVisualization(Scene):
                 script_path
             ]
             
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                cwd=temp_dir
-            )
-            
-            # Check for errors
-            if result.returncode != 0:
-                error_msg = result.stderr if result.stderr else result.stdout
-                logger.error("Manim rendering failed.")
-                logger.debug(f"Manim stderr: {result.stderr}")
-                logger.debug(f"Manim stdout: {result.stdout}")
-                raise RuntimeError(f"Manim rendering failed.\nLogs:\n{error_msg}")
-            
-            # Log Manim output for debugging
-            if result.stdout:
-                logger.debug(f"Manim stdout: {result.stdout[:500]}")
-            if result.stderr:
-                logger.debug(f"Manim stderr: {result.stderr[:500]}")
+            _run_manim(cmd, temp_dir)
             
             # Save PNG frames and get preview
             preview_tensor, mask_tensor = save_manim_frames(temp_dir)
@@ -913,8 +1350,52 @@ class DataVisualization(Scene):
 class ManimTimelineSceneNode:
     """Timeline-based scene editor with prompt-to-code generation and layer management"""
     
+    # Maximum number of validated-code digests remembered per node instance
+    CODE_CACHE_SIZE = 4096
+    
     def __init__(self) -> None:
-        pass
+        # blake2b digests of scene fragments / full scripts that already passed validation
+        self._code_cache: Dict[str, bool] = {}
+    
+    def _validate_timeline_code(self, timeline_manager: TimelineSceneManager, full_code: str) -> None:
+        """
+        Validate the generated timeline script, skipping code seen on earlier runs.
+        
+        Unchanged scripts are skipped outright. Otherwise only scene fragments
+        that changed are parsed on their own (so errors name the scene), then
+        the full script is validated once.
+        
+        Raises:
+            ValueError: If a scene fragment or the full script is invalid
+        """
+        full_key = hashlib.blake2b(full_code.encode("utf-8"), digest_size=16).hexdigest()
+        if full_key in self._code_cache:
+            return
+        
+        if len(self._code_cache) > self.CODE_CACHE_SIZE:
+            self._code_cache.clear()
+        
+        for scene in timeline_manager.layers:
+            scene_key = hashlib.blake2b(scene.manim_code.encode("utf-8"), digest_size=16).hexdigest()
+            if scene_key in self._code_cache:
+                continue
+            
+            # Fragments run inside a function with `self` bound to the scene
+            wrapped = "def _scene(self):\n" + textwrap.indent(scene.manim_code, "    ") + "\n    pass\n"
+            is_valid, validation_error = validate_python_syntax(wrapped)
+            if not is_valid:
+                error_msg = f"Scene {scene.scene_id} code has errors:\n{validation_error}"
+                logger.error(error_msg)
+                raise ValueError(f"{error_msg}\n\nCode preview:\n{scene.manim_code[:500]}...")
+            self._code_cache[scene_key] = True
+        
+        is_valid, validation_error = validate_manim_code(full_code)
+        if not is_valid:
+            error_msg = f"Generated Manim code has errors:\n{validation_error}"
+            logger.error(error_msg)
+            logger.debug(f"Invalid code preview:\n{full_code[:500]}...")
+            raise ValueError(f"{error_msg}\n\nCode preview:\n{full_code[:500]}...")
+        self._code_cache[full_key] = True
     
     @classmethod
     def INPUT_TYPES(s) -> Dict[str, Any]:
@@ -949,16 +1430,17 @@ class ManimTimelineSceneNode:
                 "caption_font": (fonts if fonts else ["Arial"], {"default": fonts[0] if fonts else "Arial"}),
                 "caption_font_size": ("INT", {"default": 48, "min": 12, "max": 200}),
                 "caption_color": (colors, {"default": "WHITE"}),
-                "caption_bg_color": (colors + ["TRANSPARENT"], {"default": "TRANSPARENT"}),
+                "caption_bg_color": (ColorPresets.get_manim_colors_with_transparent(), {"default": "TRANSPARENT"}),
                 
                 # Background
-                "background_color": (colors + ["CUSTOM"], {"default": "BLACK"}),
+                "background_color": (ColorPresets.get_manim_colors_with_custom(), {"default": "BLACK"}),
                 "background_color_hex": ("STRING", {"default": "#000000"}),
                 
                 # Rendering
                 "width": ("INT", {"default": 1920, "min": 64, "max": 4096}),
                 "height": ("INT", {"default": 1080, "min": 64, "max": 4096}),
                 "frame_rate": ("INT", {"default": 30, "min": 24, "max": 60}),
+                "render_workers": ("INT", {"default": 1, "min": 1, "max": 32}),
             }
         }
     
@@ -976,11 +1458,9 @@ class ManimTimelineSceneNode:
                                caption_font_size=48, caption_color="WHITE",
                                caption_bg_color="TRANSPARENT",
                                background_color="BLACK", background_color_hex="#000000",
-                               width=1920, height=1080, frame_rate=30):
-        try:
-            import manim
-        except ImportError:
-            raise ImportError("Manim is not installed. Please run pip install manim")
+                               width=1920, height=1080, frame_rate=30,
+                               render_workers=1):
+        _require_manim()
         
         # Initialize timeline manager
         audio_duration = 0.0
@@ -1008,18 +1488,12 @@ class ManimTimelineSceneNode:
         
         # Load or create timeline with validation
         try:
-            import json
             # Validate JSON structure
             if not timeline_json or timeline_json.strip() == "":
                 timeline_json = "{}"
                 logger.debug("Empty timeline JSON provided, creating new timeline")
             
-            timeline_data = json.loads(timeline_json)
-            if not isinstance(timeline_data, dict):
-                error_msg = "Timeline JSON must be a dictionary"
-                logger.error(error_msg)
-                raise ValueError(error_msg)
-            
+            # orjson decode errors subclass json.JSONDecodeError; non-dict JSON fails in from_dict
             timeline_manager = TimelineSceneManager.from_json(timeline_json)
             timeline_manager.audio_duration = max(timeline_manager.audio_duration, audio_duration)
             logger.debug(f"Loaded timeline with {len(timeline_manager.layers)} scenes")
@@ -1046,29 +1520,41 @@ class ManimTimelineSceneNode:
             else:
                 raise ValueError("Timeline has no scenes. Provide scenes in JSON or enable auto-detection with audio.")
         
-        # Generate code for scenes that need it
-        code_generator = PromptToCodeGenerator(use_llm=use_llm, llm_api_key=llm_api_key)
+        # Generate code for scenes that need it (one batched request for all of them)
+        code_generator = get_code_generator(use_llm=use_llm, llm_api_key=llm_api_key)
+        pending_scenes = timeline_manager.get_scenes_needing_code()
         
-        for scene in timeline_manager.layers:
-            if not scene.manim_code and scene.prompt:
-                # Generate code from prompt
-                try:
-                    scene.manim_code = code_generator.generate_code(
-                        scene.prompt,
-                        visual_type=scene.visual_type
-                    )
-                    logger.debug(f"Generated code for scene {scene.scene_id}")
-                except Exception as e:
-                    logger.warning(f"Failed to generate code for scene {scene.scene_id}: {e}")
-                    logger.debug(f"Code generation error details", exc_info=True)
+        if pending_scenes:
+            try:
+                generated_codes = code_generator.generate_code_batch(
+                    [(scene.prompt, scene.visual_type) for scene in pending_scenes]
+                )
+                logger.debug(f"Generated code for {len(pending_scenes)} scenes")
+            except Exception as e:
+                logger.warning(f"Failed to generate code for {len(pending_scenes)} scenes: {e}")
+                logger.debug(f"Code generation error details", exc_info=True)
+                generated_codes = [None] * len(pending_scenes)
+            
+            for scene, generated_code in zip(pending_scenes, generated_codes):
+                if generated_code:
+                    scene.manim_code = generated_code
+                else:
                     # Use fallback placeholder
-                    scene.manim_code = f"# Scene {scene.scene_id}: {scene.prompt}\ncircle = Circle(radius=1, color=BLUE)\nself.add(circle)"
+                    scene.manim_code = SCENE_PLACEHOLDER_TEMPLATE.format(scene_id=scene.scene_id, prompt=scene.prompt)
         
-        # Build complete Manim script
+        # Build final script in one join: header, then the timeline code with
+        # captions spliced in at the marker emitted before the timeline playback
+        header = TIMELINE_HEADER_TEMPLATE.substitute(
+            width=width,
+            height=height,
+            frame_rate=frame_rate,
+            background_color=f'"{background_color_hex}"' if background_color == "CUSTOM" else background_color
+        )
         timeline_code = timeline_manager.generate_manim_timeline_code(frame_rate)
+        parts = [header, "\n"]
         
-        # Add captions if enabled - inject into the construct method
-        if enable_captions and word_timestamps:
+        before_marker, marker, after_marker = timeline_code.partition(CAPTION_INJECT_MARKER)
+        if enable_captions and word_timestamps and marker:
             from .caption_generator import generate_caption_code
             font_config = {
                 'font': caption_font,
@@ -1082,86 +1568,72 @@ class ManimTimelineSceneNode:
                 word_timestamps, caption_style, caption_position,
                 font_config, color_config
             )
-            # Inject captions before the timeline playback
-            # Find the last line before "play_timeline" or end of construct
-            if "play_timeline(self, timeline)" in timeline_code:
-                timeline_code = timeline_code.replace(
-                    "        # Play timeline",
-                    "        # === CAPTIONS ===\n" + 
-                    "\n".join("        " + line for line in caption_code.split("\n")) + 
-                    "\n        # Play timeline"
-                )
-            elif "timeline[time_key]()" in timeline_code:
-                timeline_code = timeline_code.replace(
-                    "            timeline[time_key]()",
-                    "        # === CAPTIONS ===\n" + 
-                    "\n".join("        " + line for line in caption_code.split("\n")) + 
-                    "\n            timeline[time_key]()"
-                )
-            else:
-                # Fallback: append at end of construct
-                timeline_code = timeline_code.rstrip() + "\n        # === CAPTIONS ===\n"
-                timeline_code += "\n".join("        " + line for line in caption_code.split("\n")) + "\n"
-        
-        # Build final script
-        header = f"""from manim import *
-import numpy as np
-
-config.pixel_width = {width}
-config.pixel_height = {height}
-config.frame_rate = {frame_rate}
-"""
-        if background_color == "CUSTOM":
-            header += f'config.background_color = "{background_color_hex}"\n'
+            parts += [
+                before_marker,
+                "        # === CAPTIONS ===\n",
+                textwrap.indent(caption_code, "        "),
+                after_marker
+            ]
         else:
-            header += f'config.background_color = {background_color}\n'
+            parts.append(timeline_code)
         
-        full_code = header + "\n" + timeline_code
+        full_code = "".join(parts)
         
         # Validate code before rendering
-        is_valid, validation_error = validate_manim_code(full_code)
-        if not is_valid:
-            error_msg = f"Generated Manim code has errors:\n{validation_error}"
-            logger.error(error_msg)
-            logger.debug(f"Invalid code preview:\n{full_code[:500]}...")
-            raise ValueError(f"{error_msg}\n\nCode preview:\n{full_code[:500]}...")
+        self._validate_timeline_code(timeline_manager, full_code)
+        
+        # Reuse a previous render of the identical script (e.g. a no-op re-run)
+        render_key = _render_cache_key(full_code, width, height, frame_rate)
+        cached = _render_cache_load(render_key)
+        if cached is not None:
+            logger.info(f"Render cache hit ({render_key}), skipping Manim")
+            return (cached[0], cached[1], timeline_manager.to_json())
         
         # Render
-        with tempfile.TemporaryDirectory() as temp_dir:
-            script_path = os.path.join(temp_dir, "script.py")
+        # Scenes are independent, so a timeline without captions (which span all
+        # scenes) can be rendered as contiguous shards in parallel
+        shard_count = min(render_workers, len(timeline_manager.layers))
+        if shard_count > 1 and enable_captions and word_timestamps:
+            logger.info("Captions span the whole timeline; rendering in a single process")
+            shard_count = 1
+        
+        if shard_count > 1:
+            timeline_duration = max([timeline_manager.audio_duration] + [s.end_time for s in timeline_manager.layers])
+            render_tmp = _fast_tmp_dir(_estimate_render_mb(width, height, int(timeline_duration * frame_rate)))
+            with tempfile.TemporaryDirectory(dir=render_tmp) as temp_dir:
+                shards = _split_timeline(timeline_manager.layers, shard_count)
+                _render_timeline_shards(header, shards, frame_rate, temp_dir)
+                
+                # Save PNG frames and get preview
+                preview_tensor, mask_tensor = save_manim_frames(temp_dir)
+        else:
+            # Render into a persistent media dir with Manim's caching on, so scenes
+            # whose animations are unchanged (e.g. caption-only edits) are reused
+            graph_key = _scene_graph_key(header, timeline_manager.layers)
+            media_dir = _manim_media_dir(graph_key)
+            script_path = os.path.join(media_dir, "script.py")
             
-            with open(script_path, "w", encoding="utf-8") as f:
-                f.write(full_code)
+            _write_script(script_path, full_code)
             
             output_name = "output"
             cmd = [
                 "manim",
                 "-ql",
-                "--disable_caching",
-                "--media_dir", temp_dir,
+                "--media_dir", media_dir,
                 "-o", output_name,
                 script_path
             ]
             
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                cwd=temp_dir
-            )
-            
-            # Check for errors
-            if result.returncode != 0:
-                error_msg = result.stderr if result.stderr else result.stdout
-                logger.error("Manim rendering failed.")
-                logger.debug(f"Manim stderr: {result.stderr}")
-                logger.debug(f"Manim stdout: {result.stdout}")
-                raise RuntimeError(f"Manim rendering failed.\nLogs:\n{error_msg}")
+            _run_manim(cmd, media_dir)
             
             # Save PNG frames and get preview
-            preview_tensor, mask_tensor = save_manim_frames(temp_dir)
-            
-            # Return updated timeline JSON
-            updated_timeline_json = timeline_manager.to_json()
-            
-            return (preview_tensor, mask_tensor, updated_timeline_json)
+            preview_tensor, mask_tensor = save_manim_frames(media_dir)
+            shutil.rmtree(os.path.join(media_dir, "extracted_frames"), ignore_errors=True)
+            _prune_media_cache(keep=graph_key)
+        
+        _render_cache_store(render_key, preview_tensor)
+        
+        # Return updated timeline JSON
+        updated_timeline_json = timeline_manager.to_json()
+        
+        return (preview_tensor, mask_tensor, updated_timeline_json)
@@ -4,6 +4,7 @@ Preset library for Manim colors, shapes, fonts, easing functions, and animations
 
 import platform
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     import matplotlib.font_manager as fm
@@ -11,6 +12,45 @@ try:
 except ImportError:
     HAS_MATPLOTLIB = False
 
+try:
+    from fontTools.ttLib import TTFont
+    HAS_FONTTOOLS = True
+except ImportError:
+    HAS_FONTTOOLS = False
+
+
+# All Manim predefined color names (built once, shared by every INPUT_TYPES call)
+_MANIM_COLORS = (
+    "WHITE", "BLACK", "RED", "GREEN", "BLUE", "YELLOW", "ORANGE",
+    "PURPLE", "PINK", "GRAY", "GREY", "BROWN", "TEAL", "MAROON",
+    "GOLD", "SILVER", "RED_A", "RED_B", "RED_C", "RED_D", "RED_E",
+    "BLUE_A", "BLUE_B", "BLUE_C", "BLUE_D", "BLUE_E",
+    "GREEN_A", "GREEN_B", "GREEN_C", "GREEN_D", "GREEN_E",
+    "YELLOW_A", "YELLOW_B", "YELLOW_C", "YELLOW_D", "YELLOW_E",
+    "ORANGE_A", "ORANGE_B", "ORANGE_C", "ORANGE_D", "ORANGE_E",
+    "PURPLE_A", "PURPLE_B", "PURPLE_C", "PURPLE_D", "PURPLE_E",
+    "PINK_A", "PINK_B", "PINK_C", "PINK_D", "PINK_E",
+    "GRAY_A", "GRAY_B", "GRAY_C", "GRAY_D", "GRAY_E",
+    "GREY_A", "GREY_B", "GREY_C", "GREY_D", "GREY_E",
+    "BROWN_A", "BROWN_B", "BROWN_C", "BROWN_D", "BROWN_E",
+    "TEAL_A", "TEAL_B", "TEAL_C", "TEAL_D", "TEAL_E",
+)
+
+# ComfyUI only treats list inputs as combo boxes, so the choices handed to
+# INPUT_TYPES are lists, precomputed once with the extra sentinel options
+_MANIM_COLOR_CHOICES = list(_MANIM_COLORS)
+_MANIM_COLORS_TRANSPARENT = list(_MANIM_COLORS + ("TRANSPARENT",))
+_MANIM_COLORS_CUSTOM = list(_MANIM_COLORS + ("CUSTOM",))
+
+# Upper bound on threads used to read font files during detection
+FONT_SCAN_MAX_WORKERS = 16
+
+# Fonts offered when system font detection is unavailable
+_FALLBACK_FONTS = [
+    "Arial", "Times New Roman", "Courier New",
+    "Helvetica", "Verdana", "Georgia", "Comic Sans MS"
+]
+
 
 class ColorPresets:
     """Manim color presets and palettes"""
@@ -18,21 +58,17 @@ class ColorPresets:
     @staticmethod
     def get_manim_colors():
         """Get all Manim predefined colors"""
-        return [
-            "WHITE", "BLACK", "RED", "GREEN", "BLUE", "YELLOW", "ORANGE",
-            "PURPLE", "PINK", "GRAY", "GREY", "BROWN", "TEAL", "MAROON",
-            "GOLD", "SILVER", "RED_A", "RED_B", "RED_C", "RED_D", "RED_E",
-            "BLUE_A", "BLUE_B", "BLUE_C", "BLUE_D", "BLUE_E",
-            "GREEN_A", "GREEN_B", "GREEN_C", "GREEN_D", "GREEN_E",
-            "YELLOW_A", "YELLOW_B", "YELLOW_C", "YELLOW_D", "YELLOW_E",
-            "ORANGE_A", "ORANGE_B", "ORANGE_C", "ORANGE_D", "ORANGE_E",
-            "PURPLE_A", "PURPLE_B", "PURPLE_C", "PURPLE_D", "PURPLE_E",
-            "PINK_A", "PINK_B", "PINK_C", "PINK_D", "PINK_E",
-            "GRAY_A", "GRAY_B", "GRAY_C", "GRAY_D", "GRAY_E",
-            "GREY_A", "GREY_B", "GREY_C", "GREY_D", "GREY_E",
-            "BROWN_A", "BROWN_B", "BROWN_C", "BROWN_D", "BROWN_E",
-            "TEAL_A", "TEAL_B", "TEAL_C", "TEAL_D", "TEAL_E",
-        ]
+        return _MANIM_COLOR_CHOICES
+    
+    @staticmethod
+    def get_manim_colors_with_transparent():
+        """Get Manim colors plus a trailing "TRANSPARENT" option"""
+        return _MANIM_COLORS_TRANSPARENT
+    
+    @staticmethod
+    def get_manim_colors_with_custom():
+        """Get Manim colors plus a trailing "CUSTOM" (hex) option"""
+        return _MANIM_COLORS_CUSTOM
     
     @staticmethod
     def get_color_palettes():
@@ -102,36 +138,66 @@ class FontPresets:
     
     @staticmethod
     def get_system_fonts():
-        """Detect available system fonts"""
+        """Get available system fonts (detected once at import)"""
+        return _SYSTEM_FONTS
+    
+    @staticmethod
+    def _scan_system_fonts():
+        """Detect available system fonts by scanning the font directories"""
         if not HAS_MATPLOTLIB:
             # Fallback to common fonts
-            return [
-                "Arial", "Times New Roman", "Courier New",
-                "Helvetica", "Verdana", "Georgia", "Comic Sans MS"
-            ]
+            return _FALLBACK_FONTS
         
         try:
-            font_list = fm.findSystemFonts()
-            font_names = []
-            seen = set()
+            font_list = FontPresets._dedup_font_paths(fm.findSystemFonts())
             
-            for font_path in font_list:
-                try:
-                    font_prop = fm.FontProperties(fname=font_path)
-                    font_name = font_prop.get_name()
-                    if font_name and font_name not in seen:
-                        font_names.append(font_name)
-                        seen.add(font_name)
-                except:
-                    continue
+            # Reading font files is I/O-bound, so overlap the reads across threads
+            max_workers = min(FONT_SCAN_MAX_WORKERS, (os.cpu_count() or 1) * 2)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                font_names = set(executor.map(FontPresets._try_read_font_name, font_list))
+            font_names.discard(None)
+            font_names.discard("")
             
-            return sorted(font_names) if font_names else FontPresets.get_system_fonts.__defaults__[0]
+            return sorted(font_names) if font_names else _FALLBACK_FONTS
         except Exception:
             # Fallback to common fonts
-            return [
-                "Arial", "Times New Roman", "Courier New",
-                "Helvetica", "Verdana", "Georgia", "Comic Sans MS"
-            ]
+            return _FALLBACK_FONTS
+    
+    @staticmethod
+    def _dedup_font_paths(font_list):
+        """Drop paths that resolve to an already-seen file (symlinks, hard links, overlapping dirs)"""
+        seen = set()
+        unique_paths = []
+        for font_path in font_list:
+            try:
+                st = os.stat(font_path)
+            except OSError:
+                continue
+            file_id = (st.st_dev, st.st_ino)
+            if file_id not in seen:
+                seen.add(file_id)
+                unique_paths.append(font_path)
+        return unique_paths
+    
+    @staticmethod
+    def _try_read_font_name(font_path):
+        """Read a font's family name, returning None for unreadable files"""
+        try:
+            return FontPresets._read_font_name(font_path)
+        except Exception:
+            return None
+    
+    @staticmethod
+    def _read_font_name(font_path):
+        """Read a font's family name, parsing only its name table when fontTools is available"""
+        if HAS_FONTTOOLS:
+            font = TTFont(font_path, lazy=True, fontNumber=0)
+            try:
+                return font["name"].getBestFamilyName()
+            finally:
+                font.close()
+        
+        return fm.FontProperties(fname=font_path).get_name()
 
 
 class EasingPresets:
@@ -221,3 +287,7 @@ def animate_pulse(obj, color, duration=1):
 """,
         }
 
+
+# Font scanning walks the filesystem, so do it once per process rather than
+# on every ComfyUI node-list refresh
+_SYSTEM_FONTS = FontPresets._scan_system_fonts()
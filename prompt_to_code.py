@@ -5,8 +5,23 @@ Converts natural language prompts to Manim code using LLM or rule-based template
 
 import re
 import os
-from typing import Dict, Optional, Any
-from .presets import ColorPresets, ShapePresets
+import json
+import time
+import hashlib
+import importlib.util
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Any, List, Tuple
+import numpy as np
+
+# Relative imports inside the package; plain imports when loaded as a top-level module (tests)
+try:
+    from .presets import ColorPresets, ShapePresets
+except ImportError:
+    from presets import ColorPresets, ShapePresets
 
 # Try to import logger, fallback to print if not available
 try:
@@ -15,12 +30,329 @@ except ImportError:
     import logging
     logger = logging.getLogger(__name__)
 
+# Optional on-disk code cache backend; SQLite is used when diskcache is missing
+try:
+    import diskcache
+    HAS_DISKCACHE = True
+except ImportError:
+    HAS_DISKCACHE = False
+
+# Probed without importing it: sentence-transformers pulls in torch and transformers,
+# so it is only imported when the semantic cache is actually used
+HAS_SENTENCE_TRANSFORMERS = importlib.util.find_spec("sentence_transformers") is not None
+
+
+# OpenAI chat model used for code generation and refinement ("gpt-4" for better quality)
+LLM_MODEL = "gpt-4o-mini"
+
+# Maximum concurrent LLM requests when a batched completion can't be used
+MAX_CONCURRENT_LLM_REQUESTS = 8
+
+# Set to "1" to send multi-prompt generations through the OpenAI Batch API
+OPENAI_BATCH_ENV = "LATTICE_MANIM_OPENAI_BATCH"
+
+# Seconds to wait for a Batch API job before cancelling it and falling back
+BATCH_API_TIMEOUT = 900.0
+
+# Seconds between Batch API status polls
+BATCH_API_POLL_INTERVAL = 5.0
+
+# Generated-code entries memoized in process per generator, ahead of the disk cache
+MEMORY_CACHE_SIZE = 256
+
+# Shared on-disk code cache, probed before the package cache manager
+PROMPT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "lattice_manim_p2c")
+
+# Seconds an on-disk code cache entry stays valid (CacheManager's default TTL)
+PROMPT_CACHE_TTL_SECONDS = 86400
+
+# Set to "1" to reuse LLM code for near-duplicate prompts (needs sentence-transformers)
+SEMANTIC_CACHE_ENV = "LATTICE_MANIM_SEMANTIC_CACHE"
+
+# Local embedding model used for near-duplicate prompt lookup
+SEMANTIC_CACHE_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Minimum cosine similarity for a prior prompt's code to be reused
+SEMANTIC_CACHE_THRESHOLD = 0.95
+
+# Markdown fence wrapped around a JSON answer (```json ... ```)
+_RE_JSON_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+
+# Markdown code fences stripped from LLM responses
+_RE_FENCE = re.compile(r"```(?:python?)?\n?")
+
+# Keyword arguments rewritten by rule-based refinement
+_RE_COLOR = re.compile(r"color=\w+")
+_RE_RADIUS = re.compile(r"radius=(\d+)")
+_RE_SIDE = re.compile(r"side_length=(\d+)")
+
+# Prompt words; underscores are kept so color names like blue_e stay one token
+_RE_WORD = re.compile(r"[a-z_]+")
+
+# Whitespace runs collapsed when normalizing prompts
+_RE_WHITESPACE = re.compile(r"\s+")
+
+
+# System prompts are fixed module constants and always sent first, so every request
+# shares a byte-identical prefix that the provider's prompt cache can reuse.
+# Per-request data (prompt, context, visual type, existing code) belongs in the
+# user message only - never format it into these strings.
+
+# System prompt shared by single and batched LLM code generation
+SYSTEM_PROMPT_GEN = """You are a Manim code generator. Generate Python code for Manim animations based on natural language descriptions.
+
+Rules:
+1. Only generate the code inside the construct() method
+2. Use Manim's standard classes: Scene, Circle, Square, Text, etc.
+3. Include animations using self.play()
+4. Use proper Manim syntax and imports
+5. Keep code concise and focused on the described visual
+
+Example:
+Prompt: "A blue circle rotating in the center"
+Code:
+circle = Circle(radius=1, color=BLUE)
+self.play(Create(circle))
+self.play(Rotate(circle, PI), run_time=2)
+"""
+
+# Extra instructions for answering several prompts in one completion
+BATCH_INSTRUCTIONS = """
+You will receive a numbered list of prompts. Respond with only a JSON array of strings,
+one string of construct() body code per prompt, in the same order as the prompts."""
+
+# System prompt for batched generation (one completion answering several prompts)
+SYSTEM_PROMPT_GEN_BATCH = SYSTEM_PROMPT_GEN + BATCH_INSTRUCTIONS
+
+# System prompt for refining existing code from user feedback
+SYSTEM_PROMPT_REFINE = """You are a Manim code refiner. Modify existing Manim code based on user feedback.
+
+Keep the structure but apply the requested changes."""
+
+# Shape templates for rule-based generation, in detection priority order
+_RULE_SHAPES = {
+    "circle": "Circle(radius=1, color={color})",
+    "square": "Square(side_length=2, color={color})",
+    "rectangle": "Rectangle(width=4, height=2, color={color})",
+    "triangle": "Triangle(color={color})",
+    "sphere": "Sphere(radius=1, color={color})",
+    "cube": "Cube(side_length=2, color={color})",
+}
+
+# Animation and position words looked up by rule-based generation
+_RULE_WORDS = (
+    "rotate", "spinning", "fade", "appear", "scale", "grow", "move", "shift",
+    "left", "right", "up", "down", "center", "top", "bottom",
+)
+
+# Position words in priority order, with the placement emitted for the first one found
+_RULE_POSITIONS = (
+    ("center", "obj.move_to(ORIGIN)"),
+    ("left", "obj.to_edge(LEFT)"),
+    ("right", "obj.to_edge(RIGHT)"),
+    ("top", "obj.to_edge(UP)"),
+    ("bottom", "obj.to_edge(DOWN)"),
+)
+
+# Header of rule-generated code: object creation and placement, before any animations
+RULE_HEADER_TEMPLATE = """
+# Generated from prompt: "{prompt}"
+obj = {shape}
+
+# Position
+{position}
+
+self.add(obj)
+"""
+
+# Every keyword rule-based generation looks for (whole lowercase words of the prompt)
+_RULE_KEYWORDS = frozenset(
+    [color.lower() for color in ColorPresets.get_manim_colors()] + list(_RULE_SHAPES) + list(_RULE_WORDS)
+)
+
+# Inflection suffixes stripped before matching, longest first ("growing" -> "grow")
+_STEM_SUFFIXES = ("ing", "ed", "s")
+
+
+def _stem(word: str) -> str:
+    """Reduce a word to a crude stem so inflected forms match their rule keyword"""
+    for suffix in _STEM_SUFFIXES:
+        # Keep at least three letters so short words ("red", "is") are left alone
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            # Undo consonant doubling: "spinning" -> "spinn" -> "spin"
+            if suffix != "s" and len(word) >= 4 and word[-1] == word[-2] and word[-1] not in "aeiouls":
+                word = word[:-1]
+            break
+    # Silent e: "rotate"/"rotating", "scale"/"scaled" -> "rotat", "scal"
+    if len(word) > 3 and word.endswith("e"):
+        word = word[:-1]
+    return word
+
+
+# Rule keywords by stem (a stem can map to more than one keyword)
+_KEYWORD_STEMS: Dict[str, Tuple[str, ...]] = {}
+for _keyword in sorted(_RULE_KEYWORDS):
+    _KEYWORD_STEMS[_stem(_keyword)] = _KEYWORD_STEMS.get(_stem(_keyword), ()) + (_keyword,)
+del _keyword
+
+
+def _match_keywords(prompt_lower: str) -> frozenset:
+    """Return every rule keyword appearing in the prompt as a word or inflected form of one"""
+    stems = {_stem(token) for token in _RE_WORD.findall(prompt_lower)}
+    return frozenset(
+        keyword for stem in stems.intersection(_KEYWORD_STEMS) for keyword in _KEYWORD_STEMS[stem]
+    )
+
+
+
+
+_disk_cache = None
+
+
+class _SQLiteCodeCache:
+    """Minimal SQLite key/value store with a TTL, exposing the CacheManager get/set interface"""
+    
+    def __init__(self, directory: str, ttl_seconds: int = PROMPT_CACHE_TTL_SECONDS):
+        os.makedirs(directory, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, "cache.sqlite3"), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS generated_code "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        # Drop entries that expired since the cache was last opened
+        self._conn.execute("DELETE FROM generated_code WHERE created < ?", (time.time() - ttl_seconds,))
+        self._conn.commit()
+    
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM generated_code WHERE key = ? AND created >= ?",
+                (key, time.time() - self.ttl_seconds)
+            ).fetchone()
+        return row[0] if row else None
+    
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO generated_code (key, value, created) VALUES (?, ?, ?)",
+                (key, value, time.time())
+            )
+            self._conn.commit()
+
+
+class _DiskcacheCodeCache:
+    """diskcache.Cache behind the CacheManager get/set interface, with entries expiring after a TTL"""
+    
+    def __init__(self, directory: str, ttl_seconds: int = PROMPT_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._cache = diskcache.Cache(directory)
+    
+    def get(self, key: str) -> Optional[str]:
+        return self._cache.get(key)
+    
+    def set(self, key: str, value: str) -> None:
+        self._cache.set(key, value, expire=self.ttl_seconds)
+
+
+def _get_disk_cache():
+    """Open the on-disk code cache once (diskcache if installed, else SQLite)"""
+    global _disk_cache
+    if _disk_cache is None:
+        try:
+            if HAS_DISKCACHE:
+                _disk_cache = _DiskcacheCodeCache(PROMPT_CACHE_DIR)
+            else:
+                _disk_cache = _SQLiteCodeCache(PROMPT_CACHE_DIR)
+        except Exception as e:
+            logger.warning(f"Could not open code cache at {PROMPT_CACHE_DIR}: {e}")
+            return None
+    return _disk_cache
+
+
+_embedding_model = None
+
+
+def _normalize_prompt(prompt: str) -> str:
+    """Canonical prompt form for cache keys: trimmed, lowercased, single-spaced"""
+    return _RE_WHITESPACE.sub(" ", prompt.strip().lower())
+
+
+def _embed_prompt(prompt: str) -> np.ndarray:
+    """Embed a normalized prompt as a unit-length float32 vector (model loaded on first use)"""
+    global _embedding_model
+    if _embedding_model is None:
+        from sentence_transformers import SentenceTransformer
+        logger.info(f"Loading prompt embedding model: {SEMANTIC_CACHE_MODEL}")
+        _embedding_model = SentenceTransformer(SEMANTIC_CACHE_MODEL)
+    return _embedding_model.encode(_normalize_prompt(prompt), normalize_embeddings=True).astype(np.float32)
+
+
+# OpenAI clients shared by all generators, keyed by API key hash (keys are never stored here)
+_SHARED_CLIENTS: Dict[str, Any] = {}
+_SHARED_CLIENTS_LOCK = threading.Lock()
+
+
+def _get_shared_client(api_key: str):
+    """
+    Get or create the OpenAI client for an API key.
+    Sharing one client keeps its HTTP connection pool warm across generators.
+    
+    Args:
+        api_key: OpenAI API key
+    
+    Returns:
+        openai.OpenAI client
+    """
+    key = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+    with _SHARED_CLIENTS_LOCK:
+        client = _SHARED_CLIENTS.get(key)
+        if client is None:
+            import openai
+            client = openai.OpenAI(api_key=api_key)
+            _SHARED_CLIENTS[key] = client
+    return client
+
+
+# Generators reused across node invocations, keyed by (use_llm, api key hash)
+_generators: Dict[Tuple[bool, str], "PromptToCodeGenerator"] = {}
+
+
+def get_code_generator(use_llm: bool = True, llm_api_key: Optional[str] = None) -> "PromptToCodeGenerator":
+    """
+    Get or create a shared PromptToCodeGenerator.
+    Reusing the instance keeps the LLM client (and its HTTP connection pool) warm.
+    
+    Args:
+        use_llm: Whether to use LLM generation
+        llm_api_key: Optional API key (OPENAI_API_KEY takes precedence)
+    
+    Returns:
+        PromptToCodeGenerator instance
+    """
+    api_key = os.getenv("OPENAI_API_KEY") or (llm_api_key or "").strip()
+    key = (use_llm, hashlib.sha256(api_key.encode("utf-8")).hexdigest())
+    generator = _generators.get(key)
+    if generator is None:
+        generator = PromptToCodeGenerator(use_llm=use_llm, llm_api_key=llm_api_key)
+        _generators[key] = generator
+    return generator
+
 
 class PromptToCodeGenerator:
     """Generates Manim code from natural language prompts"""
     
+    # Shape templates as (name, template) pairs, in detection priority order
+    _shape_items = tuple(_RULE_SHAPES.items())
+    
     def __init__(self, use_llm: bool = True, llm_api_key: Optional[str] = None):
         self.use_llm = use_llm
+        
+        # Color names and their lowercase forms, computed once for rule matching
+        self._colors = ColorPresets.get_manim_colors()
+        self._colors_lower = tuple(color.lower() for color in self._colors)
         # Never store API key in plain text - use environment variable
         self._llm_api_key = None
         self.llm_client = None
@@ -37,23 +369,41 @@ class PromptToCodeGenerator:
         
         if use_llm:
             self._init_llm()
+        
+        # In-process LRU of cache key -> code, checked before the on-disk cache
+        self._memory_cache: "OrderedDict[str, str]" = OrderedDict()
+        
+        # Near-duplicate prompt index: variant key -> (embeddings, cache keys, stacked matrix)
+        self._semantic_index: Dict[str, Tuple[List[np.ndarray], List[str], Optional[np.ndarray]]] = {}
     
     def _init_llm(self):
-        """Initialize LLM client (OpenAI or compatible)"""
-        try:
-            import openai
-            if self._llm_api_key:
-                self.llm_client = openai.OpenAI(api_key=self._llm_api_key)
-                logger.info("OpenAI client initialized successfully")
-            else:
-                logger.warning("No OpenAI API key found. LLM generation will be disabled.")
-                self.use_llm = False
-        except ImportError:
+        """Check that an LLM client can be created; the client itself is built on first use"""
+        if importlib.util.find_spec("openai") is None:
             self.use_llm = False
             logger.warning("OpenAI not installed. Falling back to rule-based generation.")
+        elif not self._llm_api_key:
+            logger.warning("No OpenAI API key found. LLM generation will be disabled.")
+            self.use_llm = False
+    
+    def _ensure_client(self) -> bool:
+        """
+        Import openai and attach the shared client on first LLM use.
+        
+        Returns:
+            True if an LLM client is available
+        """
+        if self.llm_client is None and self.use_llm:
+            try:
+                self.llm_client = _get_shared_client(self._llm_api_key)
+                logger.info("OpenAI client initialized successfully")
+            except Exception as e:
+                self.use_llm = False
+                logger.warning(f"Could not initialize OpenAI client: {e}. Falling back to rule-based generation.")
+        return self.llm_client is not None
     
     def generate_code(self, prompt: str, visual_type: str = "auto",
-                     context: Optional[Dict[str, Any]] = None) -> str:
+                     context: Optional[Dict[str, Any]] = None,
+                     yield_callback: Optional[Callable[[str], None]] = None) -> str:
         """
         Generate Manim code from prompt.
         Results are cached based on prompt hash.
@@ -62,72 +412,259 @@ class PromptToCodeGenerator:
             prompt: Natural language description
             visual_type: Type of visualization ("auto", "shape", "data_viz", "custom")
             context: Additional context (colors, timing, etc.)
+            yield_callback: Optional callable receiving each new chunk of the LLM response as it streams
         
         Returns:
             Manim code string
         """
         # Check cache first
-        try:
-            from .cache_manager import get_cache_manager
-            cache_manager = get_cache_manager()
-            cache_key = f"code_gen_{hash(prompt)}_{visual_type}_{hash(str(context))}"
-            cached_code = cache_manager.get(cache_key)
-            if cached_code is not None:
-                logger.debug(f"Using cached code generation for prompt: {prompt[:50]}...")
-                return cached_code
-        except ImportError:
-            pass  # Cache not available, continue without it
+        cache_key = self._cache_key(prompt, visual_type, context)
+        cached_code = self._cache_get(cache_key)
+        if cached_code is not None:
+            logger.debug(f"Using cached code generation for prompt: {prompt[:50]}...")
+            return cached_code
         
         # Generate code
-        if self.use_llm and self.llm_client:
-            code = self._generate_with_llm(prompt, visual_type, context)
+        if self._ensure_client():
+            cached_code, embedding = self._semantic_get(prompt, visual_type, context)
+            if cached_code is not None:
+                return cached_code
+            code = self._generate_with_llm(prompt, visual_type, context, yield_callback)
+            if code is None:
+                # Rule-based stand-in for a failed LLM call; not cached so a later call retries
+                return self._generate_with_rules(prompt, visual_type, context)
+            self._semantic_add(embedding, visual_type, context, cache_key)
         else:
             code = self._generate_with_rules(prompt, visual_type, context)
+            # The mode may have just switched to rules (client creation failed)
+            cache_key = self._cache_key(prompt, visual_type, context)
         
         # Cache result
-        try:
-            cache_manager.set(cache_key, code)
-        except:
-            pass  # Cache failed, continue without it
+        self._cache_set(cache_key, code)
         
         return code
     
-    def _generate_with_llm(self, prompt: str, visual_type: str,
-                          context: Optional[Dict]) -> str:
-        """Generate code using LLM"""
-        system_prompt = """You are a Manim code generator. Generate Python code for Manim animations based on natural language descriptions.
-
-Rules:
-1. Only generate the code inside the construct() method
-2. Use Manim's standard classes: Scene, Circle, Square, Text, etc.
-3. Include animations using self.play()
-4. Use proper Manim syntax and imports
-5. Keep code concise and focused on the described visual
-
-Example:
-Prompt: "A blue circle rotating in the center"
-Code:
-circle = Circle(radius=1, color=BLUE)
-self.play(Create(circle))
-self.play(Rotate(circle, PI), run_time=2)
-"""
+    def generate_code_batch(self, items: List[Tuple[str, str]],
+                            context: Optional[Dict[str, Any]] = None) -> List[str]:
+        """
+        Generate Manim code for several prompts at once.
+        With an LLM, all uncached prompts are sent in a single completion request
+        instead of one round-trip per prompt.
         
+        Args:
+            items: List of (prompt, visual_type) tuples
+            context: Additional context shared by all prompts
+        
+        Returns:
+            List of Manim code strings, in the same order as items
+        """
+        results: List[Optional[str]] = [None] * len(items)
+        cache_keys = [self._cache_key(prompt, visual_type, context) for prompt, visual_type in items]
+        
+        # Serve what we can from cache
+        missing = []
+        for i, cache_key in enumerate(cache_keys):
+            cached_code = self._cache_get(cache_key)
+            if cached_code is not None:
+                results[i] = cached_code
+            else:
+                missing.append(i)
+        
+        embeddings = {}
+        if missing and self._ensure_client():
+            # Near-duplicates of earlier prompts reuse their code without an LLM call
+            still_missing = []
+            for i in missing:
+                prompt, visual_type = items[i]
+                cached_code, embeddings[i] = self._semantic_get(prompt, visual_type, context)
+                if cached_code is not None:
+                    results[i] = cached_code
+                else:
+                    still_missing.append(i)
+            missing = still_missing
+        
+        if missing:
+            logger.debug(f"Generating code for {len(missing)} of {len(items)} prompts ({len(items) - len(missing)} cached)")
+            missing_items = [items[i] for i in missing]
+            if self._ensure_client():
+                codes = self._generate_batch_with_llm(missing_items, context)
+            else:
+                codes = [self._generate_with_rules(prompt, visual_type, context)
+                         for prompt, visual_type in missing_items]
+                # The mode may have just switched to rules (client creation failed)
+                for i in missing:
+                    cache_keys[i] = self._cache_key(items[i][0], items[i][1], context)
+            
+            for i, code in zip(missing, codes):
+                if code is None:
+                    # Rule-based stand-in for a failed LLM call; not cached so a later call retries
+                    prompt, visual_type = items[i]
+                    results[i] = self._generate_with_rules(prompt, visual_type, context)
+                    continue
+                results[i] = code
+                self._cache_set(cache_keys[i], code)
+                if i in embeddings:
+                    self._semantic_add(embeddings[i], items[i][1], context, cache_keys[i])
+        
+        return results
+    
+    def _cache_key(self, prompt: str, visual_type: str,
+                   context: Optional[Dict[str, Any]]) -> str:
+        """
+        Build the cache key for a generation request.
+        Prompts are normalized first, so case and whitespace edits still hit the cache.
+        """
+        material = f"{_normalize_prompt(prompt)}\x00{self._variant_key(visual_type, context)}"
+        return f"code_gen_{hashlib.blake2b(material.encode('utf-8'), digest_size=16).hexdigest()}"
+    
+    def _variant_key(self, visual_type: str, context: Optional[Dict[str, Any]]) -> str:
+        """
+        Non-prompt inputs that must match exactly for cached code to be reused.
+        Includes the generation mode and model, so rule-based and LLM code never share entries.
+        Context is serialized as canonical JSON so key order doesn't change the key.
+        """
+        mode = f"llm:{LLM_MODEL}" if self.use_llm else "rules"
+        canonical = json.dumps(context or {}, sort_keys=True, separators=(",", ":"), default=str)
+        return f"{mode}\x00{visual_type}\x00{canonical}"
+    
+    def _semantic_get(self, prompt: str, visual_type: str,
+                      context: Optional[Dict[str, Any]]) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Find cached code for a near-duplicate prompt (cosine similarity >= threshold).
+        
+        Returns:
+            Tuple of (cached code or None, prompt embedding or None if disabled)
+        """
+        if not (HAS_SENTENCE_TRANSFORMERS and os.getenv(SEMANTIC_CACHE_ENV) == "1"):
+            return None, None
+        
+        try:
+            embedding = _embed_prompt(prompt)
+        except Exception as e:
+            logger.warning(f"Prompt embedding failed: {e}")
+            return None, None
+        
+        variant = self._variant_key(visual_type, context)
+        entry = self._semantic_index.get(variant)
+        if not entry:
+            return None, embedding
+        
+        vectors, keys, matrix = entry
+        if matrix is None:
+            matrix = np.stack(vectors)
+            self._semantic_index[variant] = (vectors, keys, matrix)
+        
+        similarities = matrix @ embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] >= SEMANTIC_CACHE_THRESHOLD:
+            cached_code = self._cache_get(keys[best])
+            if cached_code is not None:
+                logger.debug(f"Reusing code from similar prompt (similarity {similarities[best]:.3f})")
+                return cached_code, embedding
+        
+        return None, embedding
+    
+    def _semantic_add(self, embedding: Optional[np.ndarray], visual_type: str,
+                      context: Optional[Dict[str, Any]], cache_key: str) -> None:
+        """Index a prompt embedding so later near-duplicates can find its cached code"""
+        if embedding is None:
+            return
+        vectors, keys, _ = self._semantic_index.get(self._variant_key(visual_type, context), ([], [], None))
+        vectors.append(embedding)
+        keys.append(cache_key)
+        # Drop the stacked matrix; it is rebuilt on the next lookup
+        self._semantic_index[self._variant_key(visual_type, context)] = (vectors, keys, None)
+    
+    def _persistent_caches(self) -> List[Any]:
+        """Return the persistent code stores in lookup order: on-disk cache, then cache manager"""
+        caches = []
+        disk_cache = _get_disk_cache()
+        if disk_cache is not None:
+            caches.append(disk_cache)
+        try:
+            from .cache_manager import get_cache_manager
+            caches.append(get_cache_manager())
+        except ImportError:
+            pass  # Cache manager not available, continue without it
+        return caches
+    
+    def _cache_get(self, cache_key: str) -> Optional[str]:
+        """Look up generated code in memory, then in each persistent cache"""
+        code = self._memory_cache.get(cache_key)
+        if code is not None:
+            self._memory_cache.move_to_end(cache_key)
+            return code
+        
+        caches = self._persistent_caches()
+        for i, cache in enumerate(caches):
+            try:
+                code = cache.get(cache_key)
+            except Exception:
+                continue  # Cache failed, try the next one
+            if code is not None:
+                self._memory_set(cache_key, code)
+                # Backfill the faster stores that missed
+                for faster in caches[:i]:
+                    try:
+                        faster.set(cache_key, code)
+                    except Exception:
+                        pass
+                return code
+        return None
+    
+    def _cache_set(self, cache_key: str, code: str) -> None:
+        """Store generated code in memory and write it through to every persistent cache"""
+        self._memory_set(cache_key, code)
+        for cache in self._persistent_caches():
+            try:
+                cache.set(cache_key, code)
+            except Exception:
+                pass  # Cache failed, continue without it
+    
+    def _memory_set(self, cache_key: str, code: str) -> None:
+        """Insert into the in-process LRU, evicting the least recently used entry"""
+        self._memory_cache[cache_key] = code
+        self._memory_cache.move_to_end(cache_key)
+        if len(self._memory_cache) > MEMORY_CACHE_SIZE:
+            self._memory_cache.popitem(last=False)
+    
+    def _generation_user_prompt(self, prompt: str, context: Optional[Dict]) -> str:
+        """Build the user message for a single-prompt generation request"""
         user_prompt = f"Generate Manim code for: {prompt}"
         if context:
             user_prompt += f"\nContext: {context}"
+        return user_prompt
+    
+    def _generate_with_llm(self, prompt: str, visual_type: str,
+                          context: Optional[Dict],
+                          yield_callback: Optional[Callable[[str], None]] = None) -> Optional[str]:
+        """Generate code using LLM, streaming the response (None if the request fails)"""
+        user_prompt = self._generation_user_prompt(prompt, context)
         
         try:
-            response = self.llm_client.chat.completions.create(
-                model="gpt-4o-mini",  # or "gpt-4" for better quality
+            stream = self.llm_client.chat.completions.create(
+                model=LLM_MODEL,
                 messages=[
-                    {"role": "system", "content": system_prompt},
+                    {"role": "system", "content": SYSTEM_PROMPT_GEN},
                     {"role": "user", "content": user_prompt}
                 ],
                 temperature=0.7,
-                max_tokens=500
+                max_tokens=500,
+                stream=True
             )
             
-            code = response.choices[0].message.content.strip()
+            parts = []
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    # Only the new text is passed on; re-joining every chunk would be quadratic
+                    if yield_callback is not None:
+                        yield_callback(delta)
+            
+            code = "".join(parts).strip()
             
             # Extract code block if present
             code = self._extract_code_block(code)
@@ -136,96 +673,184 @@ self.play(Rotate(circle, PI), run_time=2)
         except Exception as e:
             logger.warning(f"LLM generation failed: {e}. Falling back to rule-based generation.")
             logger.debug(f"LLM error details", exc_info=True)
-            return self._generate_with_rules(prompt, visual_type, context)
+            return None
+    
+    def _generate_batch_with_llm(self, items: List[Tuple[str, str]],
+                                 context: Optional[Dict]) -> List[Optional[str]]:
+        """Generate code for several prompts with one LLM completion (None where a prompt failed)"""
+        if len(items) == 1:
+            prompt, visual_type = items[0]
+            return [self._generate_with_llm(prompt, visual_type, context)]
+        
+        if os.getenv(OPENAI_BATCH_ENV) == "1":
+            try:
+                return self._generate_batch_with_batch_api(items, context)
+            except Exception as e:
+                logger.warning(f"OpenAI Batch API generation failed: {e}. Falling back to a single completion.")
+                logger.debug(f"Batch API error details", exc_info=True)
+        
+        user_prompt = "Generate Manim code for each of these prompts:\n"
+        user_prompt += "\n".join(f"{i + 1}. {prompt}" for i, (prompt, _) in enumerate(items))
+        if context:
+            user_prompt += f"\nContext: {context}"
+        
+        try:
+            response = self.llm_client.chat.completions.create(
+                model=LLM_MODEL,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT_GEN_BATCH},
+                    {"role": "user", "content": user_prompt}
+                ],
+                temperature=0.7,
+                max_tokens=min(500 * len(items), 16000)
+            )
+            
+            codes = json.loads(_RE_JSON_FENCE.sub("", response.choices[0].message.content))
+            if not isinstance(codes, list) or len(codes) != len(items) or not all(isinstance(c, str) for c in codes):
+                raise ValueError(f"Expected a JSON array of {len(items)} code strings")
+            
+            return [self._extract_code_block(code) for code in codes]
+        except Exception as e:
+            logger.warning(f"Batched LLM generation failed: {e}. Falling back to concurrent requests.")
+            logger.debug(f"Batched LLM error details", exc_info=True)
+        
+        # Fall back to one request per prompt, issued concurrently
+        max_workers = min(MAX_CONCURRENT_LLM_REQUESTS, len(items))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(
+                lambda item: self._generate_with_llm(item[0], item[1], context), items
+            ))
+    
+    def _generate_batch_with_batch_api(self, items: List[Tuple[str, str]],
+                                       context: Optional[Dict]) -> List[Optional[str]]:
+        """
+        Generate code for several prompts as one OpenAI Batch API job.
+        
+        The Batch API is asynchronous (jobs may take minutes), so the job is
+        polled for at most BATCH_API_TIMEOUT seconds before being cancelled.
+        Prompts without a successful result are generated individually.
+        """
+        lines = []
+        for i, (prompt, _) in enumerate(items):
+            lines.append(json.dumps({
+                "custom_id": f"prompt-{i}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": LLM_MODEL,
+                    "messages": [
+                        {"role": "system", "content": SYSTEM_PROMPT_GEN},
+                        {"role": "user", "content": self._generation_user_prompt(prompt, context)}
+                    ],
+                    "temperature": 0.7,
+                    "max_tokens": 500
+                }
+            }))
+        
+        batch_file = self.llm_client.files.create(
+            file=("lattice_manim_batch.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch"
+        )
+        batch = self.llm_client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        logger.info(f"Submitted OpenAI batch {batch.id} with {len(items)} prompts")
+        
+        deadline = time.monotonic() + BATCH_API_TIMEOUT
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            if time.monotonic() > deadline:
+                self.llm_client.batches.cancel(batch.id)
+                raise TimeoutError(f"Batch {batch.id} not finished after {BATCH_API_TIMEOUT:.0f}s")
+            time.sleep(BATCH_API_POLL_INTERVAL)
+            batch = self.llm_client.batches.retrieve(batch.id)
+        
+        if batch.status != "completed" or not batch.output_file_id:
+            raise RuntimeError(f"Batch {batch.id} ended with status '{batch.status}'")
+        
+        codes: List[Optional[str]] = [None] * len(items)
+        for line in self.llm_client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            if response.get("status_code") == 200:
+                index = int(record["custom_id"].rsplit("-", 1)[1])
+                content = response["body"]["choices"][0]["message"]["content"]
+                codes[index] = self._extract_code_block(content.strip())
+        
+        return [
+            code if code is not None else self._generate_with_llm(prompt, visual_type, context)
+            for code, (prompt, visual_type) in zip(codes, items)
+        ]
     
     def _generate_with_rules(self, prompt: str, visual_type: str,
                             context: Optional[Dict]) -> str:
         """Generate code using rule-based templates"""
         prompt_lower = prompt.lower()
+        matched = _match_keywords(prompt_lower)
         
-        # Detect shapes
-        shapes = {
-            "circle": "Circle(radius=1, color={color})",
-            "square": "Square(side_length=2, color={color})",
-            "rectangle": "Rectangle(width=4, height=2, color={color})",
-            "triangle": "Triangle(color={color})",
-            "sphere": "Sphere(radius=1, color={color})",
-            "cube": "Cube(side_length=2, color={color})",
-        }
-        
-        # Detect colors
-        colors = ColorPresets.get_manim_colors()
+        # Detect colors (first match in preset order)
         detected_color = "BLUE"
-        for color in colors:
-            if color.lower() in prompt_lower:
+        for color, color_lower in zip(self._colors, self._colors_lower):
+            if color_lower in matched:
                 detected_color = color
                 break
         
         # Detect animations
         animations = []
-        if "rotate" in prompt_lower or "spinning" in prompt_lower:
+        if "rotate" in matched or "spinning" in matched:
             animations.append("Rotate(obj, PI, run_time=2)")
-        if "fade" in prompt_lower or "appear" in prompt_lower:
+        if "fade" in matched or "appear" in matched:
             animations.append("FadeIn(obj)")
-        if "scale" in prompt_lower or "grow" in prompt_lower:
+        if "scale" in matched or "grow" in matched:
             animations.append("obj.animate.scale(1.5)")
-        if "move" in prompt_lower or "shift" in prompt_lower:
-            if "left" in prompt_lower:
+        if "move" in matched or "shift" in matched:
+            if "left" in matched:
                 animations.append("obj.animate.shift(LEFT*2)")
-            elif "right" in prompt_lower:
+            elif "right" in matched:
                 animations.append("obj.animate.shift(RIGHT*2)")
-            elif "up" in prompt_lower:
+            elif "up" in matched:
                 animations.append("obj.animate.shift(UP*2)")
-            elif "down" in prompt_lower:
+            elif "down" in matched:
                 animations.append("obj.animate.shift(DOWN*2)")
         
         # Detect shape
         detected_shape = "Circle"
-        shape_code = shapes.get("circle", "Circle(radius=1, color={color})")
-        for shape_name, shape_template in shapes.items():
-            if shape_name in prompt_lower:
+        shape_code = _RULE_SHAPES["circle"]
+        for shape_name, shape_template in self._shape_items:
+            if shape_name in matched:
                 detected_shape = shape_name.capitalize()
                 shape_code = shape_template
                 break
         
-        # Generate code
-        code = f"""
-# Generated from prompt: "{prompt}"
-obj = {shape_code.format(color=detected_color)}
-
-# Position
-if "center" in "{prompt_lower}":
-    obj.move_to(ORIGIN)
-elif "left" in "{prompt_lower}":
-    obj.to_edge(LEFT)
-elif "right" in "{prompt_lower}":
-    obj.to_edge(RIGHT)
-elif "top" in "{prompt_lower}":
-    obj.to_edge(UP)
-elif "bottom" in "{prompt_lower}":
-    obj.to_edge(DOWN)
-else:
-    obj.move_to(ORIGIN)
-
-self.add(obj)
-"""
+        # Detect position
+        position = next(
+            (placement for word, placement in _RULE_POSITIONS if word in matched),
+            "obj.move_to(ORIGIN)"
+        )
+        
+        # Generate code (prompt collapsed to one line so it stays inside the comment)
+        parts = [RULE_HEADER_TEMPLATE.format(
+            prompt=_RE_WHITESPACE.sub(" ", prompt.strip()),
+            shape=shape_code.format(color=detected_color),
+            position=position
+        )]
         
         # Add animations
         if animations:
-            code += "\n# Animations\n"
-            for anim in animations:
-                code += f"self.play({anim})\n"
+            parts.append("\n# Animations\n")
+            parts.extend(f"self.play({anim})\n" for anim in animations)
         else:
-            code += "self.play(Create(obj))\n"
+            parts.append("self.play(Create(obj))\n")
         
-        return code
+        return "".join(parts)
     
     def _extract_code_block(self, text: str) -> str:
         """Extract code from markdown code blocks"""
-        # Remove ```python or ``` markers
-        text = re.sub(r'```python?\n?', '', text)
-        text = re.sub(r'```\n?', '', text)
-        return text.strip()
+        # Remove ```python or ``` markers in a single pass
+        return _RE_FENCE.sub('', text).strip()
     
     def refine_code(self, prompt: str, existing_code: str, 
                    feedback: str) -> str:
@@ -240,7 +865,7 @@ self.add(obj)
         Returns:
             Refined Manim code
         """
-        if self.use_llm and self.llm_client:
+        if self._ensure_client():
             return self._refine_with_llm(prompt, existing_code, feedback)
         else:
             return self._refine_with_rules(existing_code, feedback)
@@ -248,10 +873,6 @@ self.add(obj)
     def _refine_with_llm(self, prompt: str, existing_code: str,
                         feedback: str) -> str:
         """Refine code using LLM"""
-        system_prompt = """You are a Manim code refiner. Modify existing Manim code based on user feedback.
-
-Keep the structure but apply the requested changes."""
-        
         user_prompt = f"""Original prompt: {prompt}
 
 Current code:
@@ -263,9 +884,9 @@ Provide the refined code:"""
         
         try:
             response = self.llm_client.chat.completions.create(
-                model="gpt-4o-mini",
+                model=LLM_MODEL,
                 messages=[
-                    {"role": "system", "content": system_prompt},
+                    {"role": "system", "content": SYSTEM_PROMPT_REFINE},
                     {"role": "user", "content": user_prompt}
                 ],
                 temperature=0.5,
@@ -285,19 +906,22 @@ Provide the refined code:"""
         feedback_lower = feedback.lower()
         
         # Color changes
-        colors = ColorPresets.get_manim_colors()
-        for color in colors:
-            if color.lower() in feedback_lower:
-                code = re.sub(r'color=\w+', f'color={color}', code)
+        for color, color_lower in zip(self._colors, self._colors_lower):
+            if color_lower in feedback_lower:
+                code = _RE_COLOR.sub(f'color={color}', code)
                 break
         
         # Size changes
         if "bigger" in feedback_lower or "larger" in feedback_lower:
-            code = re.sub(r'radius=(\d+)', lambda m: f'radius={float(m.group(1)) * 1.5}', code)
-            code = re.sub(r'side_length=(\d+)', lambda m: f'side_length={float(m.group(1)) * 1.5}', code)
+            factor = 1.5
         elif "smaller" in feedback_lower:
-            code = re.sub(r'radius=(\d+)', lambda m: f'radius={float(m.group(1)) * 0.7}', code)
-            code = re.sub(r'side_length=(\d+)', lambda m: f'side_length={float(m.group(1)) * 0.7}', code)
+            factor = 0.7
+        else:
+            factor = None
+        
+        if factor is not None:
+            code = _RE_RADIUS.sub(lambda m: f'radius={float(m.group(1)) * factor}', code)
+            code = _RE_SIDE.sub(lambda m: f'side_length={float(m.group(1)) * factor}', code)
         
         return code
 
@@ -1,136 +1,176 @@
 """
 Component-level tests that can run without ComfyUI.
 Tests isolated components that don't require relative imports.
+
+Run with: python -m pytest test_components.py
 """
 
 import sys
 import json
 
-print("=" * 60)
-print("Component-Level Tests")
-print("=" * 60)
+import pytest
+
+from code_validator import validate_manim_code, validate_python_syntax
+from timeline_scene_manager import TimelineSceneManager, SceneLayer
+from presets import ColorPresets, FontPresets, ShapePresets, EasingPresets
+from prompt_to_code import PromptToCodeGenerator
+
 
 # Test 1: Code Validator
-print("\n[1] Testing code_validator.py...")
-try:
-    from code_validator import validate_manim_code, validate_python_syntax
-    
-    # Test valid code
-    valid_code = "from manim import *\nclass Test(Scene):\n    def construct(self):\n        pass"
-    is_valid, error = validate_manim_code(valid_code)
-    assert is_valid, f"Valid code failed: {error}"
-    print("  [OK] Valid code passes")
-    
-    # Test invalid syntax
-    invalid = "x = ("
-    is_valid, error = validate_python_syntax(invalid)
-    assert not is_valid, "Invalid syntax should fail"
-    print("  [OK] Invalid syntax caught")
-    
-    # Test missing Manim import
-    no_manim = "class Test:\n    pass"
-    is_valid, error = validate_manim_code(no_manim)
-    assert not is_valid, "Missing Manim import should fail"
-    print("  [OK] Missing Manim import caught")
-    
-    print("  [PASS] code_validator.py: ALL TESTS PASSED")
-except Exception as e:
-    print(f"  [FAIL] code_validator.py: FAILED - {e}")
-    import traceback
-    traceback.print_exc()
+@pytest.mark.parametrize("code, validator, expected", [
+    ("from manim import *\nclass Test(Scene):\n    def construct(self):\n        pass",
+     validate_manim_code, True),
+    ("x = (", validate_python_syntax, False),
+    ("class Test:\n    pass", validate_manim_code, False),
+], ids=["valid_code", "invalid_syntax", "missing_manim_import"])
+def test_code_validator(code, validator, expected):
+    is_valid, error = validator(code)
+    assert is_valid == expected, f"Unexpected validation result: {error}"
+
 
 # Test 2: Timeline Scene Manager
-print("\n[2] Testing timeline_scene_manager.py...")
-try:
-    from timeline_scene_manager import TimelineSceneManager, SceneLayer
-    
-    # Test creation
+@pytest.fixture(scope="module")
+def manager():
     manager = TimelineSceneManager(audio_duration=10.0)
+    manager.add_scene(SceneLayer(1, 0.0, 5.0, "Test scene", "auto", "code"))
+    return manager
+
+
+def test_manager_creation(manager):
     assert manager.audio_duration == 10.0
-    print("  [OK] Manager creation works")
-    
-    # Test scene creation
+    assert len(manager.layers) == 1
+
+
+def test_scene_creation():
     scene = SceneLayer(1, 0.0, 5.0, "Test scene", "auto", "code")
     assert scene.scene_id == 1
     assert scene.get_duration() == 5.0
-    print("  [OK] Scene creation works")
-    
-    # Test adding scenes
-    manager.add_scene(scene)
-    assert len(manager.layers) == 1
-    print("  [OK] Adding scenes works")
-    
-    # Test JSON serialization
+
+
+def test_json_roundtrip(manager):
     json_str = manager.to_json()
     assert isinstance(json_str, str)
     data = json.loads(json_str)
     assert "scenes" in data
     assert len(data["scenes"]) == 1
-    print("  [OK] JSON serialization works")
     
-    # Test JSON deserialization
     manager2 = TimelineSceneManager.from_json(json_str)
     assert len(manager2.layers) == 1
     assert manager2.layers[0].scene_id == 1
-    print("  [OK] JSON deserialization works")
-    
-    # Test auto-detection
+
+
+def test_auto_detection():
     word_timestamps = [
         {"word": "Hello", "start": 0.0, "end": 0.5},
         {"word": "world", "start": 0.5, "end": 1.0},
         {"word": ".", "start": 1.0, "end": 1.1},
     ]
-    scenes = manager.auto_detect_scenes(word_timestamps, method="sentence")
+    scenes = TimelineSceneManager(audio_duration=10.0).auto_detect_scenes(
+        word_timestamps, method="sentence"
+    )
     assert len(scenes) > 0
-    print(f"  [OK] Auto-detection works ({len(scenes)} scenes detected)")
-    
-    # Test code generation
+
+
+def _active_brute_force(manager, time):
+    return [s for s in manager.layers if s.start_time <= time <= s.end_time]
+
+
+def test_index_tracks_layer_changes():
+    manager = TimelineSceneManager(audio_duration=10.0)
+    for start in (0.0, 2.0, 4.0, 6.0):
+        manager.add_scene(SceneLayer(0, start, start + 1.5, "Scene", "auto", "code"))
+
+    # Move a scene behind another and append one without add_scene
+    manager.layers[3].set_in_point(1.0)
+    manager.layers.append(SceneLayer(42, 8.0, 9.0, "Appended", "auto", "code"))
+
+    for time in [t / 4 for t in range(41)]:
+        assert manager.get_scenes_at_time(time) == _active_brute_force(manager, time)
+    assert manager.get_scene(42) is manager.layers[-1]
+
+
+def test_index_tracks_end_time_changes():
+    manager = TimelineSceneManager(audio_duration=10.0)
+    for start in (0.0, 2.0, 4.0):
+        manager.add_scene(SceneLayer(0, start, start + 1.0, "Scene", "auto", "code"))
+    manager.get_scenes_at_time(0.5)
+
+    # Stretch the first scene past the later ones; the running max must follow
+    manager.layers[0].set_out_point(9.0)
+    for time in [t / 4 for t in range(41)]:
+        assert manager.get_scenes_at_time(time) == _active_brute_force(manager, time)
+
+
+def test_index_after_remove_scene():
+    manager = TimelineSceneManager(audio_duration=20.0)
+    for start in (0.0, 2.0, 4.0):
+        manager.add_scene(SceneLayer(0, start, start + 1.0, "Scene", "auto", "code"))
+
+    # Move the first scene to the end of the timeline, then remove another one
+    manager.layers[0].start_time = 10.0
+    manager.layers[0].end_time = 11.0
+    manager.remove_scene(2)
+
+    assert [s.scene_id for s in manager.get_scenes_at_time(4.5)] == [3]
+    for time in [t / 4 for t in range(49)]:
+        assert manager.get_scenes_at_time(time) == _active_brute_force(manager, time)
+
+
+def test_code_generation(manager):
     code = manager.generate_manim_timeline_code(frame_rate=30)
     assert "class TimelineScene" in code
     assert "def construct" in code
-    print("  [OK] Code generation works")
-    
-    print("  [PASS] timeline_scene_manager.py: ALL TESTS PASSED")
-except Exception as e:
-    print(f"  [FAIL] timeline_scene_manager.py: FAILED - {e}")
-    import traceback
-    traceback.print_exc()
+
 
 # Test 3: Presets
-print("\n[3] Testing presets.py...")
-try:
-    from presets import ColorPresets, FontPresets, ShapePresets, EasingPresets
-    
-    # Test color presets
+def test_color_presets():
     colors = ColorPresets.get_manim_colors()
     assert len(colors) > 0
     assert "BLUE" in colors or "RED" in colors
-    print(f"  [OK] Color presets work ({len(colors)} colors)")
-    
-    # Test font presets (may be empty if no fonts found)
-    fonts = FontPresets.get_system_fonts()
-    print(f"  [OK] Font detection works ({len(fonts)} fonts found)")
-    
-    # Test shape presets
-    shapes = ShapePresets.get_3d_objects()
-    assert len(shapes) > 0
-    print(f"  [OK] Shape presets work ({len(shapes)} shapes)")
-    
-    # Test easing presets
-    easing = EasingPresets.get_easing_functions()
-    assert len(easing) > 0
-    print(f"  [OK] Easing presets work ({len(easing)} functions)")
-    
-    print("  [PASS] presets.py: ALL TESTS PASSED")
-except Exception as e:
-    print(f"  [FAIL] presets.py: FAILED - {e}")
-    import traceback
-    traceback.print_exc()
-
-print("\n" + "=" * 60)
-print("Component Test Summary")
-print("=" * 60)
-print("\n[PASS] Components that can be tested independently work correctly.")
-print("\n[WARN] Full end-to-end testing requires ComfyUI environment.")
-print("       See TESTING.md for details on testing in ComfyUI.")
 
+
+def test_font_presets():
+    # May be empty if no fonts are installed
+    assert isinstance(FontPresets.get_system_fonts(), list)
+
+
+@pytest.mark.parametrize("getter", [
+    ShapePresets.get_3d_objects,
+    EasingPresets.get_easing_functions,
+], ids=["shapes", "easing"])
+def test_presets_not_empty(getter):
+    assert len(getter()) > 0
+
+
+# Test 4: Rule-based prompt-to-code
+@pytest.fixture(scope="module")
+def rule_generator():
+    return PromptToCodeGenerator(use_llm=False)
+
+
+@pytest.mark.parametrize("prompt, animation", [
+    ("A growing square", "obj.animate.scale(1.5)"),
+    ("A rotating circle", "Rotate(obj, PI, run_time=2)"),
+    ("A circle fading in", "FadeIn(obj)"),
+    ("A triangle scaled up", "obj.animate.scale(1.5)"),
+    ("A square shifting left", "obj.animate.shift(LEFT*2)"),
+    ("A cube appearing", "FadeIn(obj)"),
+])
+def test_rule_inflected_animations(rule_generator, prompt, animation):
+    code = rule_generator._generate_with_rules(prompt, "auto", None)
+    assert animation in code, f"Expected {animation} for prompt {prompt!r}"
+
+
+@pytest.mark.parametrize("prompt, shape", [
+    ("Three red circles", "Circle("),
+    ("Two blue squares", "Square("),
+    ("Spinning cubes", "Cube("),
+    ("Green triangles on the left", "Triangle("),
+])
+def test_rule_plural_shapes(rule_generator, prompt, shape):
+    code = rule_generator._generate_with_rules(prompt, "auto", None)
+    assert f"obj = {shape}" in code, f"Expected {shape} for prompt {prompt!r}"
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -1,27 +1,22 @@
 """
 End-to-end testing for ComfyUI Lattice Manim nodes.
 Tests actual rendering and file export functionality.
+
+Run with: python -m pytest test_e2e.py
 """
 
 import os
 import sys
-import tempfile
 import json
-import torch
-import numpy as np
+
+import pytest
 
 # Add current directory to path and set up package imports
 test_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, test_dir)
 
-# Import as package
-import importlib.util
-spec = importlib.util.spec_from_file_location("nodes", os.path.join(test_dir, "nodes.py"))
-nodes_module = importlib.util.module_from_spec(spec)
-sys.modules['nodes'] = nodes_module
+torch = pytest.importorskip("torch")
 
-# Load nodes module (this will fail on relative imports, so we need to handle it differently)
-# Instead, let's test by importing the package properly
 try:
     # Try direct import if running as module
     from nodes import (
@@ -31,19 +26,24 @@ try:
         ManimTimelineSceneNode
     )
     from timeline_scene_manager import TimelineSceneManager, SceneLayer
-except ImportError:
+except ImportError as e:
     # If that fails, we need to run it as a package
-    print("Note: Running tests requires package structure. Some tests may be skipped.")
-    print("To run full tests, use: python -m pytest test_e2e.py")
-    sys.exit(0)
+    pytest.skip(f"Running tests requires package structure: {e}", allow_module_level=True)
+
+
+@pytest.fixture(scope="session")
+def timeline_node():
+    """Single ManimTimelineSceneNode shared by every timeline test"""
+    return ManimTimelineSceneNode()
+
 
+# (width, height, frame_count) combinations exercised by the render tests
+RENDER_SIZES = [(256, 256, 15), (512, 512, 30)]
 
-def test_basic_manim_rendering():
+
+@pytest.mark.parametrize("width, height, frames", RENDER_SIZES)
+def test_basic_manim_rendering(width, height, frames):
     """Test basic Manim script node renders and exports frames"""
-    print("\n=== Test 1: Basic Manim Rendering ===")
-    
-    node = ManimScriptNode()
-    
     # Simple test code
     test_code = """
 class TestScene(Scene):
@@ -52,46 +52,33 @@ class TestScene(Scene):
         self.play(Create(circle), run_time=1)
 """
     
-    try:
-        images, masks = node.render_manim(
-            code=test_code,
-            frame_count=30,
-            width=512,
-            height=512
-        )
-        
-        # Verify output format
-        assert isinstance(images, torch.Tensor), "Images should be torch.Tensor"
-        assert isinstance(masks, torch.Tensor), "Masks should be torch.Tensor"
-        assert len(images.shape) == 4, f"Images should be 4D tensor, got {images.shape}"
-        assert images.shape[1] == 512, f"Height should be 512, got {images.shape[1]}"
-        assert images.shape[2] == 512, f"Width should be 512, got {images.shape[2]}"
-        assert images.shape[3] == 3, f"Channels should be 3 (RGB), got {images.shape[3]}"
-        assert images.shape[0] > 0, "Should have at least 1 frame"
-        
-        # Verify value range
-        assert images.min() >= 0.0 and images.max() <= 1.0, "Image values should be normalized 0-1"
-        
-        # Verify mask
-        assert masks.shape[:3] == images.shape[:3], "Mask shape should match image shape"
-        assert masks.min() == 1.0, "Mask should be all ones"
-        
-        print(f"✅ PASSED: Rendered {images.shape[0]} frames, shape {images.shape}")
-        return True
-        
-    except Exception as e:
-        print(f"❌ FAILED: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
+    node = ManimScriptNode()
+    images, masks = node.render_manim(
+        code=test_code,
+        frame_count=frames,
+        width=width,
+        height=height
+    )
+    
+    # Verify output format
+    assert isinstance(images, torch.Tensor), "Images should be torch.Tensor"
+    assert isinstance(masks, torch.Tensor), "Masks should be torch.Tensor"
+    assert len(images.shape) == 4, f"Images should be 4D tensor, got {images.shape}"
+    assert images.shape[1] == height, f"Height should be {height}, got {images.shape[1]}"
+    assert images.shape[2] == width, f"Width should be {width}, got {images.shape[2]}"
+    assert images.shape[3] == 3, f"Channels should be 3 (RGB), got {images.shape[3]}"
+    assert images.shape[0] > 0, "Should have at least 1 frame"
+    
+    # Verify value range
+    assert images.min() >= 0.0 and images.max() <= 1.0, "Image values should be normalized 0-1"
+    
+    # Verify mask
+    assert masks.shape[:3] == images.shape[:3], "Mask shape should match image shape"
+    assert masks.min() == 1.0, "Mask should be all ones"
 
 
-def test_timeline_node_basic():
+def test_timeline_node_basic(timeline_node):
     """Test timeline node with simple scene"""
-    print("\n=== Test 2: Timeline Node Basic ===")
-    
-    node = ManimTimelineSceneNode()
-    
     # Create simple timeline JSON
     timeline_data = {
         "audio_duration": 5.0,
@@ -115,43 +102,30 @@ self.play(Create(circle), run_time=2)
     
     timeline_json = json.dumps(timeline_data, indent=2)
     
-    try:
-        images, masks, updated_json = node.render_timeline_scenes(
-            timeline_json=timeline_json,
-            auto_detect_scenes=False,
-            enable_captions=False,
-            width=512,
-            height=512,
-            frame_rate=30
-        )
-        
-        # Verify output
-        assert isinstance(images, torch.Tensor), "Images should be torch.Tensor"
-        assert isinstance(masks, torch.Tensor), "Masks should be torch.Tensor"
-        assert isinstance(updated_json, str), "Updated JSON should be string"
-        
-        # Verify JSON is valid
-        updated_data = json.loads(updated_json)
-        assert "scenes" in updated_data, "Updated JSON should have scenes"
-        
-        # Verify we got frames
-        assert images.shape[0] > 0, "Should have rendered frames"
-        
-        print(f"✅ PASSED: Timeline rendered {images.shape[0]} frames")
-        print(f"   Output shape: {images.shape}")
-        return True
-        
-    except Exception as e:
-        print(f"❌ FAILED: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
+    images, masks, updated_json = timeline_node.render_timeline_scenes(
+        timeline_json=timeline_json,
+        auto_detect_scenes=False,
+        enable_captions=False,
+        width=512,
+        height=512,
+        frame_rate=30
+    )
+    
+    # Verify output
+    assert isinstance(images, torch.Tensor), "Images should be torch.Tensor"
+    assert isinstance(masks, torch.Tensor), "Masks should be torch.Tensor"
+    assert isinstance(updated_json, str), "Updated JSON should be string"
+    
+    # Verify JSON is valid
+    updated_data = json.loads(updated_json)
+    assert "scenes" in updated_data, "Updated JSON should have scenes"
+    
+    # Verify we got frames
+    assert images.shape[0] > 0, "Should have rendered frames"
 
 
 def test_timeline_auto_detection():
     """Test timeline auto-detection from word timestamps"""
-    print("\n=== Test 3: Timeline Auto-Detection ===")
-    
     # Create mock word timestamps
     word_timestamps = [
         {"word": "Hello", "start": 0.0, "end": 0.5},
@@ -170,34 +144,35 @@ def test_timeline_auto_detection():
     assert len(scenes) > 0, "Should detect at least one scene"
     assert scenes[0].start_time == 0.0, "First scene should start at 0.0"
     assert scenes[0].end_time >= 1.0, "First scene should end after first sentence"
-    
-    print(f"✅ PASSED: Auto-detected {len(scenes)} scenes")
-    for i, scene in enumerate(scenes):
-        print(f"   Scene {i+1}: {scene.start_time:.2f}s - {scene.end_time:.2f}s")
-    
-    return True
 
 
-def test_code_validation():
-    """Test code validation catches errors"""
-    print("\n=== Test 4: Code Validation ===")
-    
-    from code_validator import validate_manim_code, validate_python_syntax
-    
-    # Test valid code
-    valid_code = """
+@pytest.mark.parametrize("code, expected", [
+    ("""
 from manim import *
 
 class Test(Scene):
     def construct(self):
         circle = Circle()
         self.add(circle)
-"""
-    is_valid, error = validate_manim_code(valid_code)
-    assert is_valid, f"Valid code should pass: {error}"
-    print("✅ Valid code passed validation")
+""", True),
+    ("""
+class Test:
+    def construct(self):
+        pass
+""", False),
+], ids=["valid_code", "missing_manim_import"])
+def test_code_validation(code, expected):
+    """Test code validation catches errors"""
+    from code_validator import validate_manim_code
+    
+    is_valid, error = validate_manim_code(code)
+    assert is_valid == expected, f"Unexpected validation result: {error}"
+
+
+def test_syntax_validation():
+    """Test syntax validation reports an error message"""
+    from code_validator import validate_python_syntax
     
-    # Test invalid syntax
     invalid_syntax = """
 from manim import *
 
@@ -209,31 +184,15 @@ class Test(Scene):
     is_valid, error = validate_python_syntax(invalid_syntax)
     assert not is_valid, "Invalid syntax should fail"
     assert error is not None, "Should return error message"
-    print("✅ Invalid syntax caught")
-    
-    # Test missing Manim import
-    no_manim = """
-class Test:
-    def construct(self):
-        pass
-"""
-    is_valid, error = validate_manim_code(no_manim)
-    assert not is_valid, "Code without Manim import should fail"
-    print("✅ Missing Manim import caught")
-    
-    return True
 
 
-def test_timeline_json_validation():
+@pytest.mark.parametrize("timeline_json", ["not valid json", "{}"],
+                         ids=["invalid_json", "empty_timeline"])
+def test_timeline_json_validation(timeline_node, timeline_json):
     """Test timeline JSON validation"""
-    print("\n=== Test 5: Timeline JSON Validation ===")
-    
-    node = ManimTimelineSceneNode()
-    
-    # Test invalid JSON
     try:
-        images, masks, json_out = node.render_timeline_scenes(
-            timeline_json="not valid json",
+        images, masks, json_out = timeline_node.render_timeline_scenes(
+            timeline_json=timeline_json,
             auto_detect_scenes=False,
             enable_captions=False,
             width=256,
@@ -242,34 +201,14 @@ def test_timeline_json_validation():
         )
         # Should create empty timeline
         assert isinstance(images, torch.Tensor), "Should handle invalid JSON gracefully"
-        print("✅ Invalid JSON handled gracefully")
-    except ValueError as e:
+    except ValueError:
         # This is also acceptable - validation error
-        print(f"✅ Invalid JSON caught: {e}")
-    
-    # Test empty timeline
-    try:
-        images, masks, json_out = node.render_timeline_scenes(
-            timeline_json="{}",
-            auto_detect_scenes=False,
-            enable_captions=False,
-            width=256,
-            height=256,
-            frame_rate=30
-        )
-        print("⚠️  Empty timeline accepted (may need scenes)")
-    except ValueError as e:
-        print(f"✅ Empty timeline properly rejected: {e}")
-    
-    return True
+        pass
 
 
-def test_export_format():
+@pytest.mark.parametrize("width, height, frames", RENDER_SIZES)
+def test_export_format(width, height, frames):
     """Test that exported files are in correct format"""
-    print("\n=== Test 6: Export Format Verification ===")
-    
-    node = ManimScriptNode()
-    
     test_code = """
 class ExportTest(Scene):
     def construct(self):
@@ -277,102 +216,32 @@ class ExportTest(Scene):
         self.play(Create(square), run_time=1)
 """
     
-    try:
-        images, masks = node.render_manim(
-            code=test_code,
-            frame_count=30,
-            width=256,
-            height=256
-        )
-        
-        # Check tensor properties
-        assert images.dtype == torch.float32, f"Images should be float32, got {images.dtype}"
-        assert masks.dtype == torch.float32, f"Masks should be float32, got {masks.dtype}"
-        
-        # Check value range
-        assert images.min() >= 0.0, "Image values should be >= 0"
-        assert images.max() <= 1.0, "Image values should be <= 1"
-        
-        # Check shape consistency
-        assert images.shape[0] == masks.shape[0], "Number of frames should match"
-        assert images.shape[1] == masks.shape[1], "Height should match"
-        assert images.shape[2] == masks.shape[2], "Width should match"
-        
-        # Verify it's actually RGB (not BGR or grayscale)
-        # Check that different channels have different values (not all same)
-        sample_frame = images[0].numpy()
-        r_channel = sample_frame[:, :, 0]
-        g_channel = sample_frame[:, :, 1]
-        b_channel = sample_frame[:, :, 2]
-        
-        # For a colored scene, channels should differ
-        # (This is a basic check - a red square should have different R/G/B)
-        print(f"   Sample frame stats:")
-        print(f"   R channel: min={r_channel.min():.3f}, max={r_channel.max():.3f}, mean={r_channel.mean():.3f}")
-        print(f"   G channel: min={g_channel.min():.3f}, max={g_channel.max():.3f}, mean={g_channel.mean():.3f}")
-        print(f"   B channel: min={b_channel.min():.3f}, max={b_channel.max():.3f}, mean={b_channel.mean():.3f}")
-        
-        print("✅ PASSED: Export format is correct")
-        print(f"   Images: {images.shape}, dtype={images.dtype}")
-        print(f"   Masks: {masks.shape}, dtype={masks.dtype}")
-        return True
-        
-    except Exception as e:
-        print(f"❌ FAILED: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
-
-
-def run_all_tests():
-    """Run all e2e tests"""
-    print("=" * 60)
-    print("ComfyUI Lattice Manim - End-to-End Tests")
-    print("=" * 60)
-    
-    tests = [
-        ("Basic Manim Rendering", test_basic_manim_rendering),
-        ("Timeline Node Basic", test_timeline_node_basic),
-        ("Timeline Auto-Detection", test_timeline_auto_detection),
-        ("Code Validation", test_code_validation),
-        ("Timeline JSON Validation", test_timeline_json_validation),
-        ("Export Format", test_export_format),
-    ]
-    
-    results = []
-    for test_name, test_func in tests:
-        try:
-            result = test_func()
-            results.append((test_name, result))
-        except Exception as e:
-            print(f"❌ Test '{test_name}' crashed: {e}")
-            import traceback
-            traceback.print_exc()
-            results.append((test_name, False))
-    
-    # Summary
-    print("\n" + "=" * 60)
-    print("Test Summary")
-    print("=" * 60)
+    node = ManimScriptNode()
+    images, masks = node.render_manim(
+        code=test_code,
+        frame_count=frames,
+        width=width,
+        height=height
+    )
     
-    passed = sum(1 for _, result in results if result)
-    total = len(results)
+    # Check tensor properties
+    assert images.dtype == torch.float32, f"Images should be float32, got {images.dtype}"
+    assert masks.dtype == torch.float32, f"Masks should be float32, got {masks.dtype}"
     
-    for test_name, result in results:
-        status = "✅ PASSED" if result else "❌ FAILED"
-        print(f"{status}: {test_name}")
+    # Check value range
+    assert images.min() >= 0.0, "Image values should be >= 0"
+    assert images.max() <= 1.0, "Image values should be <= 1"
     
-    print(f"\nTotal: {passed}/{total} tests passed")
+    # Check shape consistency
+    assert images.shape[0] == masks.shape[0], "Number of frames should match"
+    assert images.shape[1] == masks.shape[1], "Height should match"
+    assert images.shape[2] == masks.shape[2], "Width should match"
     
-    if passed == total:
-        print("\n🎉 All tests passed!")
-        return 0
-    else:
-        print(f"\n⚠️  {total - passed} test(s) failed")
-        return 1
+    # Verify it's actually RGB (not BGR or grayscale): the red square's R channel
+    # must peak above its B channel across the rendered frames
+    channel_max = images.flatten(0, 2).amax(dim=0)
+    assert channel_max[0] > channel_max[2], f"Red square should be red in RGB order, got channel maxima {channel_max.tolist()}"
 
 
 if __name__ == "__main__":
-    exit_code = run_all_tests()
-    sys.exit(exit_code)
-
+    sys.exit(pytest.main([__file__]))
@@ -1,11 +1,16 @@
 """
 Simple end-to-end test that can run directly.
 Tests actual rendering and file export functionality.
+
+Run with: python -m pytest test_e2e_simple.py (or python test_e2e_simple.py)
 """
 
 import os
 import sys
 import json
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
 
 # Set up path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -32,6 +37,8 @@ try:
     print("✅ Imports successful")
     
 except ImportError as e:
+    if __name__ != "__main__":
+        pytest.skip(f"Running tests requires package structure: {e}", allow_module_level=True)
     print(f"❌ Import failed: {e}")
     print("\nTo run tests properly:")
     print("1. Make sure you're in the project directory")
@@ -42,12 +49,20 @@ finally:
     os.chdir(original_dir)
 
 
-def test_basic_manim_rendering():
-    """Test basic Manim script node renders and exports frames"""
+# Set to "1" to also run the separate export-format render
+FULL_E2E_ENV = "RUN_FULL_E2E"
+
+
+@pytest.fixture(scope="session")
+def basic_render():
+    """(images, masks) of the basic render, shared by the tests that inspect it"""
+    return render_basic_scene(nodes.ManimScriptNode())
+
+
+def render_basic_scene(node):
+    """Render the basic test scene and return (images, masks)"""
     print("\n=== Test 1: Basic Manim Rendering ===")
     
-    node = nodes.ManimScriptNode()
-    
     # Simple test code
     test_code = """
 class TestScene(Scene):
@@ -56,39 +71,39 @@ class TestScene(Scene):
         self.play(Create(circle), run_time=1)
 """
     
-    try:
-        print("Rendering test scene (this may take 10-30 seconds)...")
-        images, masks = node.render_manim(
-            code=test_code,
-            frame_count=30,
-            width=512,
-            height=512
-        )
-        
-        # Verify output format
-        assert isinstance(images, type(images)), "Images should be torch.Tensor"
-        assert len(images.shape) == 4, f"Images should be 4D tensor, got {images.shape}"
-        assert images.shape[1] == 512, f"Height should be 512, got {images.shape[1]}"
-        assert images.shape[2] == 512, f"Width should be 512, got {images.shape[2]}"
-        assert images.shape[3] == 3, f"Channels should be 3 (RGB), got {images.shape[3]}"
-        assert images.shape[0] > 0, "Should have at least 1 frame"
-        
-        # Verify value range
-        assert images.min() >= 0.0 and images.max() <= 1.0, "Image values should be normalized 0-1"
-        
-        # Verify mask
-        assert masks.shape[:3] == images.shape[:3], "Mask shape should match image shape"
-        
-        print(f"✅ PASSED: Rendered {images.shape[0]} frames, shape {images.shape}")
-        print(f"   Image dtype: {images.dtype}, range: [{images.min():.3f}, {images.max():.3f}]")
-        print(f"   Mask dtype: {masks.dtype}, all ones: {(masks == 1.0).all()}")
-        return True
-        
-    except Exception as e:
-        print(f"❌ FAILED: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
+    print("Rendering test scene (this may take 10-30 seconds)...")
+    return node.render_manim(
+        code=test_code,
+        frame_count=30,
+        width=512,
+        height=512
+    )
+
+
+def check_basic_output(images, masks):
+    """Check the basic render's output shape and value range"""
+    # Verify output format
+    assert isinstance(images, type(images)), "Images should be torch.Tensor"
+    assert len(images.shape) == 4, f"Images should be 4D tensor, got {images.shape}"
+    assert images.shape[1] == 512, f"Height should be 512, got {images.shape[1]}"
+    assert images.shape[2] == 512, f"Width should be 512, got {images.shape[2]}"
+    assert images.shape[3] == 3, f"Channels should be 3 (RGB), got {images.shape[3]}"
+    assert images.shape[0] > 0, "Should have at least 1 frame"
+    
+    # Verify value range
+    assert images.min() >= 0.0 and images.max() <= 1.0, "Image values should be normalized 0-1"
+    
+    # Verify mask
+    assert masks.shape[:3] == images.shape[:3], "Mask shape should match image shape"
+    
+    print(f"✅ PASSED: Rendered {images.shape[0]} frames, shape {images.shape}")
+    print(f"   Image dtype: {images.dtype}, range: [{images.min():.3f}, {images.max():.3f}]")
+    print(f"   Mask dtype: {masks.dtype}, all ones: {(masks == 1.0).all()}")
+
+
+def test_basic_manim_rendering(basic_render):
+    """Test basic Manim script node renders and exports frames"""
+    check_basic_output(*basic_render)
 
 
 def test_code_validation():
@@ -131,8 +146,6 @@ class Test:
     is_valid, error = validate_manim_code(no_manim)
     assert not is_valid, "Code without Manim import should fail"
     print("✅ Missing Manim import caught")
-    
-    return True
 
 
 def test_timeline_auto_detection():
@@ -161,8 +174,6 @@ def test_timeline_auto_detection():
     print(f"✅ PASSED: Auto-detected {len(scenes)} scenes")
     for i, scene in enumerate(scenes):
         print(f"   Scene {i+1}: {scene.start_time:.2f}s - {scene.end_time:.2f}s")
-    
-    return True
 
 
 def test_timeline_json_roundtrip():
@@ -190,16 +201,38 @@ def test_timeline_json_roundtrip():
     print("✅ PASSED: JSON roundtrip successful")
     print(f"   Serialized {len(manager.layers)} scenes")
     print(f"   Deserialized {len(manager2.layers)} scenes")
-    
-    return True
 
 
-def test_export_format():
-    """Test that exported files are in correct format"""
+def check_export_format(images, masks):
+    """Check that rendered output is in the correct export format"""
     print("\n=== Test 5: Export Format Verification ===")
     
-    node = nodes.ManimScriptNode()
+    # Check tensor properties
+    assert images.dtype.name == 'float32', f"Images should be float32, got {images.dtype}"
+    assert masks.dtype.name == 'float32', f"Masks should be float32, got {masks.dtype}"
+    
+    # Check value range
+    assert images.min() >= 0.0, "Image values should be >= 0"
+    assert images.max() <= 1.0, "Image values should be <= 1"
     
+    # Check shape consistency
+    assert images.shape[0] == masks.shape[0], "Number of frames should match"
+    assert images.shape[1] == masks.shape[1], "Height should match"
+    assert images.shape[2] == masks.shape[2], "Width should match"
+    
+    print("✅ PASSED: Export format is correct")
+    print(f"   Images: {images.shape}, dtype={images.dtype}")
+    print(f"   Masks: {masks.shape}, dtype={masks.dtype}")
+    print(f"   Value range: [{images.min():.3f}, {images.max():.3f}]")
+
+
+def test_export_format(basic_render):
+    """Test that exported frames are in correct format (checked on the basic render)"""
+    check_export_format(*basic_render)
+
+
+def render_export_scene(node):
+    """Render the separate export test scene and return (images, masks)"""
     test_code = """
 class ExportTest(Scene):
     def construct(self):
@@ -207,66 +240,84 @@ class ExportTest(Scene):
         self.play(Create(square), run_time=1)
 """
     
+    print("Rendering export test (this may take 10-30 seconds)...")
+    return node.render_manim(
+        code=test_code,
+        frame_count=30,
+        width=256,
+        height=256
+    )
+
+
+@pytest.mark.skipif(os.getenv(FULL_E2E_ENV) != "1", reason=f"set {FULL_E2E_ENV}=1 to run")
+def test_export_format_full_render():
+    """Test export format on a separate render (only run with RUN_FULL_E2E=1)"""
+    check_export_format(*render_export_scene(nodes.ManimScriptNode()))
+
+
+def _run(test_name, test_func, *args):
+    """Run one check for the script runner, reporting failures instead of raising"""
     try:
-        print("Rendering export test (this may take 10-30 seconds)...")
-        images, masks = node.render_manim(
-            code=test_code,
-            frame_count=30,
-            width=256,
-            height=256
-        )
-        
-        # Check tensor properties
-        assert images.dtype.name == 'float32', f"Images should be float32, got {images.dtype}"
-        assert masks.dtype.name == 'float32', f"Masks should be float32, got {masks.dtype}"
-        
-        # Check value range
-        assert images.min() >= 0.0, "Image values should be >= 0"
-        assert images.max() <= 1.0, "Image values should be <= 1"
-        
-        # Check shape consistency
-        assert images.shape[0] == masks.shape[0], "Number of frames should match"
-        assert images.shape[1] == masks.shape[1], "Height should match"
-        assert images.shape[2] == masks.shape[2], "Width should match"
-        
-        print("✅ PASSED: Export format is correct")
-        print(f"   Images: {images.shape}, dtype={images.dtype}")
-        print(f"   Masks: {masks.shape}, dtype={masks.dtype}")
-        print(f"   Value range: [{images.min():.3f}, {images.max():.3f}]")
+        test_func(*args)
         return True
-        
     except Exception as e:
-        print(f"❌ FAILED: {e}")
+        print(f"❌ Test '{test_name}' failed: {e}")
         import traceback
         traceback.print_exc()
         return False
 
 
+def run_full_export_render():
+    """Separate export render for the script runner (runs in a worker process)"""
+    return _run("Export Format (full render)", test_export_format_full_render)
+
+
 def run_all_tests():
     """Run all e2e tests"""
     print("=" * 60)
     print("ComfyUI Lattice Manim - End-to-End Tests")
     print("=" * 60)
     
-    tests = [
+    # Fast tests run serially in this process
+    fast_tests = [
         ("Code Validation", test_code_validation),
         ("Timeline Auto-Detection", test_timeline_auto_detection),
         ("Timeline JSON Roundtrip", test_timeline_json_roundtrip),
-        ("Basic Manim Rendering", test_basic_manim_rendering),
-        ("Export Format", test_export_format),
     ]
     
-    results = []
-    for test_name, test_func in tests:
+    results = [(test_name, _run(test_name, test_func)) for test_name, test_func in fast_tests]
+    
+    # Export format is checked on the basic render's output. RUN_FULL_E2E=1 also runs
+    # the separate export render, overlapped with the basic render in a worker process.
+    executor = ProcessPoolExecutor(max_workers=1) if os.getenv(FULL_E2E_ENV) == "1" else None
+    try:
+        export_future = executor.submit(run_full_export_render) if executor else None
+        
         try:
-            result = test_func()
-            results.append((test_name, result))
+            rendered = render_basic_scene(nodes.ManimScriptNode())
         except Exception as e:
-            print(f"❌ Test '{test_name}' crashed: {e}")
+            print(f"❌ FAILED: {e}")
             import traceback
             traceback.print_exc()
-            results.append((test_name, False))
-    
+            rendered = None
+            
+        if rendered is not None:
+            results.append(("Basic Manim Rendering", _run("Basic Manim Rendering", check_basic_output, *rendered)))
+            results.append(("Export Format", _run("Export Format", check_export_format, *rendered)))
+        else:
+            results.append(("Basic Manim Rendering", False))
+            results.append(("Export Format", False))
+            
+        if export_future is not None:
+            try:
+                results.append(("Export Format (full render)", export_future.result()))
+            except Exception as e:
+                print(f"❌ Test 'Export Format (full render)' crashed: {e}")
+                results.append(("Export Format (full render)", False))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+            
     # Summary
     print("\n" + "=" * 60)
     print("Test Summary")
@@ -278,7 +329,7 @@ def run_all_tests():
     for test_name, result in results:
         status = "✅ PASSED" if result else "❌ FAILED"
         print(f"{status}: {test_name}")
-    
+        
     print(f"\nTotal: {passed}/{total} tests passed")
     
     if passed == total:
@@ -292,4 +343,3 @@ def run_all_tests():
 if __name__ == "__main__":
     exit_code = run_all_tests()
     sys.exit(exit_code)
-
@@ -1,33 +1,40 @@
-from nodes import ManimScriptNode
-import torch
+"""
+Quick render check for ManimScriptNode.
+
+Run with: python -m pytest test_node.py
+"""
 
-# 1. Instantiate the node
-node = ManimScriptNode()
+import sys
 
-# 2. Define a simple test script (A red square rotating)
-test_code = """
+import pytest
+
+torch = pytest.importorskip("torch")
+
+try:
+    from nodes import ManimScriptNode
+except ImportError as e:
+    pytest.skip(f"Running tests requires package structure: {e}", allow_module_level=True)
+
+
+# Simple test script (A red square rotating)
+TEST_CODE = """
 class TestScene(Scene):
     def construct(self):
         sq = Square(color=RED, fill_opacity=1)
         self.play(Rotate(sq, PI/2), run_time=1)
 """
 
-print("Rendering test scene... (This may take a few seconds)")
 
-try:
-    # 3. Run the render (Low res 512x512 for speed, 30 frames)
-    images, masks = node.render_manim(test_code, frame_count=30, width=512, height=512)
-
-    # 4. Verify output
-    print(f"Success!")
-    print(f"   Output Shape: {images.shape}")
-    print(f"   Expected:     (30, 512, 512, 3)")
-    
-    if images.shape == (30, 512, 512, 3):
-        print("   Status:       PASSED")
-    else:
-        print("   Status:       DIMENSION MISMATCH")
-
-except Exception as e:
-    print(f"Failed: {e}")
+def test_render_dimensions():
+    """Render at low res (512x512, 30 frames) and check the output shape"""
+    node = ManimScriptNode()
+    images, masks = node.render_manim(TEST_CODE, frame_count=30, width=512, height=512)
+
+    # The node returns preview frame(s); the full render is exported to the output directory
+    assert images.shape[0] >= 1, "Should return at least 1 frame"
+    assert tuple(images.shape[1:]) == (512, 512, 3), f"Expected frames of (512, 512, 3), got {tuple(images.shape[1:])}"
+    assert masks.shape[:3] == images.shape[:3], "Mask shape should match image shape"
+
 
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -3,16 +3,129 @@ Timeline scene management module.
 Handles scene detection, layer management, and in/out frame control.
 """
 
+from bisect import bisect_right
+from itertools import accumulate
 from typing import List, Dict, Optional
+import importlib.util
 import json
+import textwrap
+import numpy as np
+
+# Placeholder line in generated construct() bodies where callers splice caption code
+CAPTION_INJECT_MARKER = "        # __CAPTION_INJECT__"
+
+# Placeholder code for timeline-mode scenes that have no Manim code yet
+_PLACEHOLDER_TEMPLATE = (
+    "# Scene {scene_id}: {title}\n"
+    "# Auto-generated placeholder\n"
+    "circle = Circle(radius=1, color=BLUE)\n"
+    "self.add(circle)\n"
+    "self.play(Create(circle), run_time={duration:.2f})\n"
+)
+
+# Placeholder circle for one code-less scene in a sequential-mode AnimationGroup
+_PLACEHOLDER_GROUP_ENTRY_TEMPLATE = (
+    "\n"
+    "        # Scene {scene_id}: {title}\n"
+    "        circle_{scene_id} = Circle(radius=1, color=BLUE)\n"
+)
+
+# Trailing punctuation that closes a sentence during scene auto-detection
+SENTENCE_END_PUNCTUATION = ('.', '!', '?', ':', ';')
+
+# Code points of SENTENCE_END_PUNCTUATION, for vectorized last-character checks
+_SENTENCE_END_CODES = np.array([ord(p) for p in SENTENCE_END_PUNCTUATION], dtype=np.uint32)
+
+# Whether manim-play-timeline is installed, probed once without importing it
+_HAS_PLAY_TIMELINE = importlib.util.find_spec("manim_play_timeline") is not None
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+    
+    def njit(*args, **kwargs):
+        """No-op stand-in for numba.njit so the boundary finder runs as plain Python"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+
+@njit(cache=True)
+def _detect_boundaries(starts, ends, sentence_end, gap_thresh, max_dur):
+    """
+    Find scene split points in a word timeline.
+    
+    A new scene starts after a sentence-ending word, after a silence longer
+    than gap_thresh, or once the current scene has lasted max_dur seconds.
+    
+    Args:
+        starts: float64 array of word start times
+        ends: float64 array of word end times
+        sentence_end: bool array, True where a word closes a sentence
+        gap_thresh: Silence (seconds) that forces a split
+        max_dur: Maximum scene length (seconds)
+    
+    Returns:
+        int32 array of word indices where a new scene begins
+    """
+    n = starts.shape[0]
+    splits = np.empty(n, dtype=np.int32)
+    count = 0
+    scene_start = starts[0] if n > 0 else 0.0
+    
+    for i in range(n - 1):
+        if (sentence_end[i]
+                or starts[i + 1] - ends[i] > gap_thresh
+                or ends[i] - scene_start >= max_dur):
+            splits[count] = i + 1
+            count += 1
+            scene_start = starts[i + 1]
+    
+    return splits[:count]
+
+
+if HAS_NUMBA:
+    # Pay the JIT compile cost once at import instead of on the first timeline
+    _warmup = np.linspace(0.0, 1.0, 10)
+    _detect_boundaries(_warmup, _warmup + 0.05, np.zeros(10, dtype=np.bool_), np.inf, np.inf)
+    del _warmup
+
+
+# SceneLayer attributes serialized by to_dict(); assigning any of them drops the cached dict
+_SERIALIZED_ATTRS = frozenset((
+    "scene_id", "start_time", "end_time", "prompt", "visual_type",
+    "manim_code", "elements", "auto_generated",
+))
+
+# SceneLayer attributes the TimelineSceneManager id/start-time indexes are built from
+_INDEXED_ATTRS = frozenset(("scene_id", "start_time"))
 
 
 class SceneLayer:
     """Represents a single scene layer with in/out frames"""
     
+    __slots__ = (
+        "scene_id", "start_time", "end_time", "prompt", "visual_type",
+        "manim_code", "elements", "auto_generated", "_dict_cache",
+    )
+    
+    # Bumped whenever any layer's id/start time (or end time) is reassigned, so managers
+    # can tell their indexes may be stale (a layer can sit in several managers at once)
+    _index_epoch = 0
+    _ends_epoch = 0
+    
     def __init__(self, scene_id: int, start_time: float, end_time: float,
                  prompt: str = "", visual_type: str = "auto",
                  manim_code: str = "", elements: List[Dict] = None):
+        self._dict_cache = None  # Last to_dict() result, reused until an attribute changes
         self.scene_id = scene_id
         self.start_time = start_time  # In point (seconds)
         self.end_time = end_time      # Out point (seconds)
@@ -22,18 +135,34 @@ class SceneLayer:
         self.elements = elements or []
         self.auto_generated = False
     
+    def __setattr__(self, name, value):
+        if name in _SERIALIZED_ATTRS:
+            object.__setattr__(self, "_dict_cache", None)
+            # Initial assignments in __init__ can't invalidate an index the layer isn't in yet
+            if name in _INDEXED_ATTRS and hasattr(self, name):
+                SceneLayer._index_epoch += 1
+            elif name == "end_time" and hasattr(self, name):
+                SceneLayer._ends_epoch += 1
+        object.__setattr__(self, name, value)
+    
     def to_dict(self):
-        """Convert to dictionary for serialization"""
-        return {
-            "id": self.scene_id,
-            "start_time": self.start_time,
-            "end_time": self.end_time,
-            "prompt": self.prompt,
-            "visual_type": self.visual_type,
-            "manim_code": self.manim_code,
-            "elements": self.elements,
-            "auto_generated": self.auto_generated
-        }
+        """
+        Convert to dictionary for serialization.
+        Times are rounded to milliseconds, which keeps the JSON short and cheap to encode.
+        The dict is cached until a serialized attribute is reassigned; treat it as read-only.
+        """
+        if self._dict_cache is None:
+            self._dict_cache = {
+                "id": self.scene_id,
+                "start_time": round(self.start_time, 3),
+                "end_time": round(self.end_time, 3),
+                "prompt": self.prompt,
+                "visual_type": self.visual_type,
+                "manim_code": self.manim_code,
+                "elements": self.elements,
+                "auto_generated": self.auto_generated
+            }
+        return self._dict_cache
     
     @classmethod
     def from_dict(cls, data: Dict):
@@ -69,15 +198,26 @@ class TimelineSceneManager:
         self.audio_duration = audio_duration
         self.layers: List[SceneLayer] = []
         self.next_scene_id = 1
+        
+        # Lookup indexes over self.layers, rebuilt by sort_layers()/remove_scene() and
+        # lazily by _ensure_index() after layer times change or layers are added directly
+        self._by_id: Dict[int, SceneLayer] = {}
+        self._starts: List[float] = []  # start_time of each layer, in layer order
+        self._max_ends: List[float] = []  # Running max of end_time up to each layer
+        self._mark_indexed()
     
     def auto_detect_scenes(self, word_timestamps: List[Dict], 
-                          method: str = "sentence") -> List[SceneLayer]:
+                          method: str = "sentence",
+                          gap_threshold: Optional[float] = None,
+                          max_scene_duration: Optional[float] = None) -> List[SceneLayer]:
         """
         Auto-detect scenes from word timestamps.
         
         Args:
-            word_timestamps: List of word dicts with 'word', 'start', 'end'
+            word_timestamps: WordTimeline, or list of word dicts with 'word', 'start', 'end'
             method: 'sentence' (split on punctuation) or 'time' (fixed intervals)
+            gap_threshold: In 'sentence' mode, also split on silences longer than this (seconds)
+            max_scene_duration: In 'sentence' mode, also split scenes longer than this (seconds)
         
         Returns:
             List of detected SceneLayer objects
@@ -85,41 +225,52 @@ class TimelineSceneManager:
         scenes = []
         
         if method == "sentence":
-            # Group words into sentences
-            sentences = []
-            current_sentence = []
-            
-            for word_data in word_timestamps:
-                word = word_data['word'].strip()
-                if not word:
-                    continue
-                
-                current_sentence.append(word_data)
+            # Work on parallel arrays (WordTimeline) rather than per-word dicts
+            if hasattr(word_timestamps, "starts"):
+                words = [w.strip() for w in word_timestamps.words]
+                starts = np.asarray(word_timestamps.starts, dtype=np.float64)
+                ends = np.asarray(word_timestamps.ends, dtype=np.float64)
                 
-                # Check if word ends sentence
-                if any(word.endswith(p) for p in ['.', '!', '?', ':', ';']):
-                    if current_sentence:
-                        sentences.append(current_sentence)
-                        current_sentence = []
+                # Drop empty tokens
+                keep = np.flatnonzero([bool(w) for w in words])
+                if len(keep) < len(words):
+                    words = [words[i] for i in keep]
+                    starts = starts[keep]
+                    ends = ends[keep]
+            else:
+                # Single pass over the dicts: strip each word once, skip empty tokens
+                words = []
+                start_list = []
+                end_list = []
+                for w in word_timestamps:
+                    word = w['word'].strip()
+                    if word:
+                        words.append(word)
+                        start_list.append(w['start'])
+                        end_list.append(w['end'])
+                starts = np.array(start_list, dtype=np.float64)
+                ends = np.array(end_list, dtype=np.float64)
             
-            # Add remaining words
-            if current_sentence:
-                sentences.append(current_sentence)
+            # Last character of every (non-empty) word as UTF-32 code points, tested in one pass
+            last_chars = np.frombuffer("".join([w[-1] for w in words]).encode("utf-32-le"), dtype=np.uint32)
+            sentence_end = np.isin(last_chars, _SENTENCE_END_CODES)
+            split_points = _detect_boundaries(
+                starts, ends, sentence_end,
+                np.inf if gap_threshold is None else float(gap_threshold),
+                np.inf if max_scene_duration is None else float(max_scene_duration)
+            )
+            bounds = np.concatenate(([0], split_points, [len(words)]))
             
             # Create scenes from sentences
-            for i, sentence_words in enumerate(sentences):
-                if not sentence_words:
+            for first, last in zip(bounds[:-1], bounds[1:]):
+                if first >= last:
                     continue
                 
-                start_time = sentence_words[0]['start']
-                end_time = sentence_words[-1]['end']
-                sentence_text = ' '.join(w['word'].strip() for w in sentence_words)
-                
                 scene = SceneLayer(
                     scene_id=self.next_scene_id,
-                    start_time=start_time,
-                    end_time=end_time,
-                    prompt=sentence_text,
+                    start_time=float(starts[first]),
+                    end_time=float(ends[last - 1]),
+                    prompt=' '.join(words[first:last]),
                     visual_type="auto",
                     manim_code=""
                 )
@@ -147,23 +298,34 @@ class TimelineSceneManager:
         
         return scenes
     
+    def get_scenes_needing_code(self) -> List[SceneLayer]:
+        """Get scenes (typically auto-generated) that have a prompt but no Manim code yet"""
+        return [scene for scene in self.layers if scene.prompt and not scene.manim_code]
+    
     def add_scene(self, scene: SceneLayer):
         """Add a scene layer to the timeline"""
+        self._ensure_index()
         scene.scene_id = self.next_scene_id
         self.next_scene_id += 1
-        self.layers.append(scene)
-        self.sort_layers()
+        
+        # Insert in start-time order (after equal starts, as a stable sort would)
+        index = bisect_right(self._starts, scene.start_time)
+        self.layers.insert(index, scene)
+        self._starts.insert(index, scene.start_time)
+        self._by_id[scene.scene_id] = scene
+        self._rebuild_max_ends(index)
+        self._mark_indexed()
     
     def remove_scene(self, scene_id: int):
         """Remove a scene by ID"""
         self.layers = [s for s in self.layers if s.scene_id != scene_id]
+        # Sort too: layer times may have changed since the last index build
+        self.sort_layers()
     
     def get_scene(self, scene_id: int) -> Optional[SceneLayer]:
         """Get scene by ID"""
-        for scene in self.layers:
-            if scene.scene_id == scene_id:
-                return scene
-        return None
+        self._ensure_index()
+        return self._by_id.get(scene_id)
     
     def update_scene(self, scene_id: int, **kwargs):
         """Update scene properties"""
@@ -172,37 +334,130 @@ class TimelineSceneManager:
             for key, value in kwargs.items():
                 if hasattr(scene, key):
                     setattr(scene, key, value)
+            if "scene_id" in kwargs or "start_time" in kwargs:
+                self.sort_layers()
+            elif "end_time" in kwargs:
+                self._rebuild_max_ends()
+                self._mark_indexed()
     
     def sort_layers(self):
-        """Sort layers by start time"""
+        """Sort layers by start time and rebuild the lookup indexes"""
         self.layers.sort(key=lambda s: s.start_time)
+        self._reindex()
+    
+    def _reindex(self):
+        """Rebuild the id and start-time indexes (call after changing layers directly)"""
+        # Reversed so the first layer wins if ids are duplicated, as with a linear scan
+        self._by_id = {scene.scene_id: scene for scene in reversed(self.layers)}
+        self._starts = [scene.start_time for scene in self.layers]
+        self._rebuild_max_ends()
+        self._mark_indexed()
+    
+    def _mark_indexed(self):
+        """Record that the indexes reflect every layer change made so far"""
+        self._indexed_epoch = SceneLayer._index_epoch
+        self._indexed_ends_epoch = SceneLayer._ends_epoch
+    
+    def _ensure_index(self):
+        """Bring the indexes up to date with layer changes made outside the manager"""
+        if self._indexed_epoch != SceneLayer._index_epoch or len(self._starts) != len(self.layers):
+            # Ids/start times changed or layers were added directly: re-sort and reindex
+            self.sort_layers()
+        elif self._indexed_ends_epoch != SceneLayer._ends_epoch:
+            # Only end times changed, so layer order holds; the running max does not
+            self._rebuild_max_ends()
+            self._mark_indexed()
+    
+    def _rebuild_max_ends(self, start: int = 0):
+        """Recompute the running max of end times from layer index `start` onwards"""
+        running = self._max_ends[start - 1] if start else float("-inf")
+        self._max_ends[start:] = list(
+            accumulate((scene.end_time for scene in self.layers[start:]), max, initial=running)
+        )[1:]
     
     def get_scenes_at_time(self, time: float) -> List[SceneLayer]:
         """Get all scenes active at a given time"""
-        return [
-            scene for scene in self.layers
-            if scene.start_time <= time <= scene.end_time
-        ]
-    
-    def to_json(self) -> str:
-        """Export timeline to JSON"""
-        data = {
+        self._ensure_index()
+        # Only layers starting at or before `time` can be active; walk back from the last
+        # of them until no earlier layer can still be running (running max end < time)
+        index = bisect_right(self._starts, time) - 1
+        active = []
+        while index >= 0 and self._max_ends[index] >= time:
+            scene = self.layers[index]
+            if scene.end_time >= time:
+                active.append(scene)
+            index -= 1
+        active.reverse()
+        return active
+    
+    def to_dict(self) -> Dict:
+        """Convert timeline to a JSON-serializable dictionary"""
+        return {
             "audio_duration": self.audio_duration,
             "scenes": [scene.to_dict() for scene in self.layers]
         }
-        return json.dumps(data, indent=2)
+    
+    def to_json(self, compact: bool = False) -> str:
+        """
+        Export timeline to JSON (orjson when available).
+        
+        Args:
+            compact: Emit minified JSON for in-process storage instead of indented output
+        """
+        if HAS_ORJSON:
+            option = orjson.OPT_SERIALIZE_NUMPY if compact else orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY
+            return orjson.dumps(self.to_dict(), option=option).decode("utf-8")
+        if compact:
+            return json.dumps(self.to_dict(), separators=(",", ":"))
+        return json.dumps(self.to_dict(), indent=2)
+    
+    def to_json_file(self, path: str, compact: bool = True) -> None:
+        """
+        Write the timeline as JSON to a file, encoding one scene at a time
+        so the whole document never has to exist as a single string.
+        
+        Args:
+            path: Output file path
+            compact: Minified JSON (default) instead of indented output
+        """
+        if not compact:
+            # json.dump already writes the encoder's chunks incrementally
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f, indent=2)
+            return
+        
+        if HAS_ORJSON:
+            def encode(value) -> bytes:
+                return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY)
+        else:
+            def encode(value) -> bytes:
+                return json.dumps(value, separators=(",", ":")).encode("utf-8")
+        
+        with open(path, "wb") as f:
+            f.write(b'{"audio_duration":' + encode(self.audio_duration) + b',"scenes":[')
+            for index, scene in enumerate(self.layers):
+                if index:
+                    f.write(b",")
+                f.write(encode(scene.to_dict()))
+            f.write(b"]}")
     
     @classmethod
     def from_json(cls, json_str: str):
-        """Import timeline from JSON"""
-        data = json.loads(json_str)
+        """Import timeline from JSON (orjson when available)"""
+        if HAS_ORJSON:
+            return cls.from_dict(orjson.loads(json_str))
+        return cls.from_dict(json.loads(json_str))
+    
+    @classmethod
+    def from_dict(cls, data: Dict):
+        """Import timeline from an already-parsed JSON dictionary"""
         manager = cls(audio_duration=data.get("audio_duration", 0.0))
         
-        for scene_data in data.get("scenes", []):
-            scene = SceneLayer.from_dict(scene_data)
-            manager.layers.append(scene)
-            manager.next_scene_id = max(manager.next_scene_id, scene.scene_id + 1)
-        
+        manager.layers.extend([SceneLayer.from_dict(scene_data) for scene_data in data.get("scenes", [])])
+        # One max over the loaded ids, never below the default starting id
+        manager.next_scene_id = max(manager.next_scene_id,
+                                    max((s.scene_id for s in manager.layers), default=0) + 1)
+
         manager.sort_layers()
         return manager
     
@@ -218,7 +473,7 @@ class TimelineSceneManager:
             word_timestamps: Optional word timestamps for captions
             caption_config: Optional caption configuration dict
         """
-        code = """
+        parts = ["""
 from manim import *
 try:
     from manim_play_timeline import play_timeline
@@ -229,55 +484,67 @@ except ImportError:
 
 class TimelineScene(Scene):
     def construct(self):
-"""
+"""]
         
         # If no timeline library, use sequential playback
         if not self.layers:
-            code += "        # No scenes in timeline\n        pass\n"
-            return code
+            parts.append("        # No scenes in timeline\n        pass\n")
+            parts.append(CAPTION_INJECT_MARKER + "\n")
+            return "".join(parts)
         
         # Check if we should use timeline or sequential
-        use_timeline = True
-        try:
-            import importlib
-            importlib.import_module('manim_play_timeline')
-        except ImportError:
-            use_timeline = False
+        use_timeline = _HAS_PLAY_TIMELINE
         
         if use_timeline:
-            code += "        timeline = {}\n"
+            parts.append("        timeline = {}\n")
+        else:
+            parts.append("        # Sequential scene playback (manim-play-timeline not available)\n")
+        
+        # One pass over the scenes; the playback mode only selects the emitted template
+        pending = []  # Consecutive code-less scenes in sequential mode, played as one group
+        for scene in self.layers:
+            if not use_timeline and not scene.manim_code:
+                pending.append(scene)
+                continue
+            if pending:
+                parts.append(self._placeholder_group_code(pending))
+                pending = []
             
-            # Add scenes to timeline
-            for scene in self.layers:
-                start_time_seconds = scene.start_time
-                duration = scene.get_duration()
-                
-                # Generate scene code
-                if scene.manim_code:
-                    scene_code = scene.manim_code
-                else:
-                    # Ensure duration is positive
-                    safe_duration = max(0.01, duration)
-                    scene_code = f"""# Scene {scene.scene_id}: {scene.prompt[:50] if scene.prompt else 'Untitled'}
-# Auto-generated placeholder
-circle = Circle(radius=1, color=BLUE)
-self.add(circle)
-self.play(Create(circle), run_time={safe_duration:.2f})
-"""
-                
+            scene_id = scene.scene_id
+            start_time = scene.start_time
+            
+            # Generate scene code (get_duration already clamps to a positive run time)
+            if scene.manim_code:
+                scene_code = scene.manim_code
+            else:
+                scene_code = _PLACEHOLDER_TEMPLATE.format(
+                    scene_id=scene_id,
+                    title=scene.prompt[:50] if scene.prompt else 'Untitled',
+                    duration=scene.get_duration()
+                )
+            
+            if use_timeline:
                 # Create a function that executes the scene code
                 # play_timeline will call this at the right time
-                code += f"""
-        # Scene {scene.scene_id} at {start_time_seconds:.2f}s
-        def scene_{scene.scene_id}_exec():
+                parts.append(f"""
+        # Scene {scene_id} at {start_time:.2f}s
+        def scene_{scene_id}_exec():
 {self._indent_code(scene_code, 12)}
         
-        timeline[{start_time_seconds}] = scene_{scene.scene_id}_exec
-"""
-            
-            # Captions will be added by the caller (nodes.py) to avoid circular imports
-            
-            code += """
+        timeline[{start_time}] = scene_{scene_id}_exec
+""")
+            else:
+                parts.append(f"\n        # Scene {scene_id}\n")
+                parts.append(self._indent_code(scene_code, 8))
+        
+        if pending:
+            parts.append(self._placeholder_group_code(pending))
+        
+        # Captions will be added by the caller (nodes.py) to avoid circular imports
+        parts.append("\n" + CAPTION_INJECT_MARKER + "\n")
+        
+        if use_timeline:
+            parts.append("""
         # Play timeline
         if HAS_TIMELINE:
             play_timeline(self, timeline)
@@ -285,36 +552,27 @@ self.play(Create(circle), run_time={safe_duration:.2f})
             # Fallback: sequential playback
             for time_key in sorted(timeline.keys()):
                 timeline[time_key]()
-"""
-        else:
-            # Sequential playback fallback
-            code += "        # Sequential scene playback (manim-play-timeline not available)\n"
-            for scene in self.layers:
-                duration = scene.get_duration()
-                if scene.manim_code:
-                    scene_code = scene.manim_code
-                else:
-                    scene_code = f"""# Scene {scene.scene_id}: {scene.prompt[:50] if scene.prompt else 'Untitled'}
-circle = Circle(radius=1, color=BLUE)
-self.add(circle)
-self.play(Create(circle), run_time={duration:.2f})
-"""
-                code += f"\n        # Scene {scene.scene_id}\n"
-                code += self._indent_code(scene_code, 8)
-            
-            # Captions will be added by the caller (nodes.py) to avoid circular imports
+""")
         
-        return code
+        return "".join(parts)
+    
+    def _placeholder_group_code(self, scenes: List[SceneLayer]) -> str:
+        """
+        Sequential-mode code for consecutive scenes without Manim code.
+        Their placeholder circles are created back to back by a single
+        AnimationGroup (lag_ratio=1) instead of one play() call per scene.
+        """
+        parts = []
+        animations = []
+        for scene in scenes:
+            parts.append(_PLACEHOLDER_GROUP_ENTRY_TEMPLATE.format(
+                scene_id=scene.scene_id,
+                title=scene.prompt[:50] if scene.prompt else 'Untitled'
+            ))
+            animations.append(f"Create(circle_{scene.scene_id}, run_time={scene.get_duration():.2f})")
+        parts.append(f"        self.play(AnimationGroup({', '.join(animations)}, lag_ratio=1))\n")
+        return "".join(parts)
     
     def _indent_code(self, code: str, spaces: int) -> str:
-        """Indent code by specified number of spaces"""
-        indent = " " * spaces
-        lines = code.split("\n")
-        result = []
-        for line in lines:
-            if line.strip():  # Only indent non-empty lines
-                result.append(indent + line)
-            else:
-                result.append("")  # Keep empty lines empty
-        return "\n".join(result)
-
+        """Indent code by specified number of spaces (blank lines are left unindented)"""
+        return textwrap.indent(code, " " * spaces)